@@ -6,11 +6,20 @@ BBR Network OpenAI Assistant Chat Application - Render.com Optimized Version
 import streamlit as st
 import os
 import json
-import requests
+import logging
 import base64
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs
 
+import requests
+
+import assistant_client
+import openai_http
+import run_waiter
+
+# Show the modules' timing/stats lines (run polls, audio trimming, persistence queue); no-op on reruns
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 # Page config must be the first Streamlit command
 st.set_page_config(
     page_title="BBR Intelligence - Web Assistant",
@@ -55,6 +64,11 @@ except ImportError:
         st.error("❌ OPENAI_ASSISTANT_ID environment variable is not set. Please configure it in your Render.com service settings.")
         st.stop()
 
+openai_http.configure(OPENAI_API_KEY)
+
+# Stream answers token by token; polling remains as the fallback
+STREAM_RESPONSES = os.getenv("OPENAI_STREAM", "true").lower() in ("1", "true", "yes")
+
 # Define BBR colors
 BBR_BLUE = "#003876"
 BBR_LIGHT_BLUE = "#e8f0f9"
@@ -156,14 +170,8 @@ st.markdown(header_content, unsafe_allow_html=True)
 def create_thread():
     """Create a new conversation thread"""
     try:
-        url = "https://api.openai.com/v1/threads"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-            "OpenAI-Beta": "assistants=v2"
-        }
-        
-        response = requests.post(url, headers=headers, json={})
+        url = "/threads"
+        response = openai_http.post(url, json={})
         response.raise_for_status()
         
         thread_data = response.json()
@@ -175,19 +183,14 @@ def create_thread():
 def add_message_to_thread(thread_id, message):
     """Add a user message to the thread"""
     try:
-        url = f"https://api.openai.com/v1/threads/{thread_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-            "OpenAI-Beta": "assistants=v2"
-        }
+        url = f"/threads/{thread_id}/messages"
         
         data = {
             "role": "user",
             "content": message
         }
         
-        response = requests.post(url, headers=headers, json=data)
+        response = openai_http.post(url, json=data)
         response.raise_for_status()
         return True
     except Exception as e:
@@ -197,18 +200,13 @@ def add_message_to_thread(thread_id, message):
 def run_assistant(thread_id):
     """Run the assistant on the thread"""
     try:
-        url = f"https://api.openai.com/v1/threads/{thread_id}/runs"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-            "OpenAI-Beta": "assistants=v2"
-        }
+        url = f"/threads/{thread_id}/runs"
         
         data = {
             "assistant_id": ASSISTANT_ID
         }
         
-        response = requests.post(url, headers=headers, json=data)
+        response = openai_http.post(url, json=data)
         response.raise_for_status()
         
         run_data = response.json()
@@ -218,33 +216,28 @@ def run_assistant(thread_id):
         return None
 
 def get_run_status(thread_id, run_id):
-    """Check the status of an assistant run"""
+    """Fetch an assistant run (its "status" drives the waiter)"""
     try:
-        url = f"https://api.openai.com/v1/threads/{thread_id}/runs/{run_id}"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "OpenAI-Beta": "assistants=v2"
-        }
+        url = f"/threads/{thread_id}/runs/{run_id}"
         
-        response = requests.get(url, headers=headers)
+        response = openai_http.get(url)
         response.raise_for_status()
         
-        run_data = response.json()
-        return run_data["status"]
-    except Exception as e:
-        st.error(f"Error getting run status: {str(e)}")
-        return None
+        return response.json()
+    except (requests.ConnectionError, requests.Timeout):
+        # A dropped poll says nothing about the run; keep waiting until the deadline
+        return {"id": run_id, "status": "unknown"}
+    except requests.HTTPError as e:
+        if e.response.status_code == 429 or e.response.status_code >= 500:
+            return {"id": run_id, "status": "unknown"}
+        raise  # bad key, missing run, ...: waiting will not fix it
 
 def get_thread_messages(thread_id):
     """Get all messages from the thread"""
     try:
-        url = f"https://api.openai.com/v1/threads/{thread_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "OpenAI-Beta": "assistants=v2"
-        }
+        url = f"/threads/{thread_id}/messages"
         
-        response = requests.get(url, headers=headers)
+        response = openai_http.get(url)
         response.raise_for_status()
         
         messages_data = response.json()
@@ -253,6 +246,58 @@ def get_thread_messages(thread_id):
         st.error(f"Error getting messages: {str(e)}")
         return []
 
+def poll_assistant_reply(thread_id, prompt):
+    """Add the message, run the assistant and poll until the answer is ready"""
+    # Add message to thread
+    if not add_message_to_thread(thread_id, prompt):
+        st.error("❌ Failed to send message")
+        return None
+
+    # Run assistant
+    run_id = run_assistant(thread_id)
+    if not run_id:
+        st.error("❌ Failed to run assistant")
+        return None
+
+    # Wait for completion
+    try:
+        result = run_waiter.wait_for_run(lambda: get_run_status(thread_id, run_id))
+    except Exception as e:
+        assistant_client.cancel_run(thread_id, run_id)
+        st.error(f"❌ Error checking run status: {str(e)}")
+        return None
+    st.session_state.last_run_stats = {"status": result.status, "polls": result.polls, "seconds": round(result.elapsed, 2)}
+
+    if result.status in run_waiter.UNFINISHED_STATUSES:
+        assistant_client.cancel_run(thread_id, run_id)
+    if result.status != "completed":
+        st.error(f"❌ {run_waiter.describe_failure(result)}")
+        return None
+
+    # Get the latest messages
+    messages = get_thread_messages(thread_id)
+    if not messages:
+        st.error("❌ No messages retrieved")
+        return None
+
+    # Get the latest assistant message
+    latest_message = messages[0]
+    if latest_message["role"] != "assistant":
+        st.error("❌ No assistant response found")
+        return None
+    return latest_message["content"][0]["text"]["value"]
+
+def stream_assistant_reply(thread_id, prompt):
+    """Stream the answer token by token, falling back to polling if streaming is unavailable"""
+    try:
+        yield from assistant_client.stream_turn(ASSISTANT_ID, thread_id, prompt)
+    except assistant_client.StreamUnavailable:
+        content = poll_assistant_reply(thread_id, prompt)
+        if content:
+            yield content
+    except Exception as e:
+        st.error(f"❌ {str(e)}")
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = [
@@ -288,51 +333,15 @@ if prompt := st.chat_input("Ask me about construction, engineering, or BBR servi
     
     # Get assistant response
     with st.chat_message("assistant", avatar=assistant_avatar):
-        with st.spinner("Thinking..."):
-            # Add message to thread
-            if add_message_to_thread(st.session_state.thread_id, prompt):
-                # Run assistant
-                run_id = run_assistant(st.session_state.thread_id)
-                
-                if run_id:
-                    # Wait for completion
-                    import time
-                    max_wait = 30  # Maximum wait time in seconds
-                    waited = 0
-                    
-                    while waited < max_wait:
-                        status = get_run_status(st.session_state.thread_id, run_id)
-                        
-                        if status == "completed":
-                            break
-                        elif status in ["failed", "cancelled", "expired"]:
-                            st.error(f"❌ Assistant run {status}")
-                            break
-                        
-                        time.sleep(1)
-                        waited += 1
-                    
-                    if status == "completed":
-                        # Get the latest messages
-                        messages = get_thread_messages(st.session_state.thread_id)
-                        
-                        if messages:
-                            # Get the latest assistant message
-                            latest_message = messages[0]
-                            if latest_message["role"] == "assistant":
-                                content = latest_message["content"][0]["text"]["value"]
-                                st.markdown(content)
-                                st.session_state.messages.append({"role": "assistant", "content": content})
-                            else:
-                                st.error("❌ No assistant response found")
-                        else:
-                            st.error("❌ No messages retrieved")
-                    else:
-                        st.error("❌ Assistant response timed out")
-                else:
-                    st.error("❌ Failed to run assistant")
-            else:
-                st.error("❌ Failed to send message")
+        if STREAM_RESPONSES:
+            content = st.write_stream(stream_assistant_reply(st.session_state.thread_id, prompt))
+        else:
+            with st.spinner("Thinking..."):
+                content = poll_assistant_reply(st.session_state.thread_id, prompt)
+            if content:
+                st.markdown(content)
+        if content:
+            st.session_state.messages.append({"role": "assistant", "content": content})
 
 # Serve background image as base64 for iframe integration
 if web_background_base64:
@@ -353,6 +362,7 @@ st.markdown(f"""
 if os.getenv('RENDER') != 'true':  # Only show locally, not on Render
     with st.expander("🔧 Debug Info"):
         st.write(f"Thread ID: {st.session_state.get('thread_id', 'Not set')}")
+        st.write(f"Last run: {st.session_state.get('last_run_stats', 'n/a')}")
         st.write(f"Images directory exists: {os.path.exists('images/')}")
         st.write(f"BBR Logo exists: {os.path.exists(bbr_logo_path) if bbr_logo_path else 'N/A'}")
         st.write(f"Assistant avatar: {assistant_avatar}")
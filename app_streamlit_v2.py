@@ -6,15 +6,32 @@ BBR Network OpenAI Assistant Chat Application (v2 API Version) - SCROLLING FIX
 import streamlit as st
 import os
 import json
-import requests
-import base64
+import logging
+import sqlite3
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
 from audio_recorder_streamlit import audio_recorder
-from pypdf import PdfReader
-from docx import Document
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import assets
+import assistant_client
+import async_backend
+import caching
+import documents
+import message_store
+import opener
+import retrieval
+import semantic_cache
+import transcription
+import voice_pipeline
+import vector_store
+import openai_http
+import supabase_client
+
+# Show the modules' timing/stats lines (run polls, audio trimming, persistence queue); no-op on reruns
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 # Page config must be the first Streamlit command
 st.set_page_config(
@@ -33,566 +50,391 @@ except ImportError:
 # Allow override via env; fallback to config or default assistant
 ASSISTANT_ID = os.getenv('OPENAI_ASSISTANT_ID_OVERRIDE') or os.getenv('OPENAI_ASSISTANT_ID') or CONFIG_ASSISTANT_ID or "asst_mKMsW8mKPQPzt5rVFBeBB8bu"
 
+# Persist sessions/messages to Supabase (see docs/supabase_schema.sql)
+PERSIST_CHATS = os.getenv("PERSIST_CHATS", "").lower() in ("1", "true", "yes")
+
+# Stream answers token by token (Assistants v2 stream=true); polling is the fallback
+STREAM_RESPONSES = os.getenv("OPENAI_STREAM", "true").lower() in ("1", "true", "yes")
+
+# Messages rendered per rerun; older ones are paged in with "Load earlier messages"
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "30"))
+# Recent voice transcripts kept per session for the sidebar list
+VOICE_HISTORY_SHOWN = 3
+
+# "async" multiplexes all sessions' OpenAI calls on one event loop (async_backend)
+OPENAI_BACKEND = os.getenv("OPENAI_BACKEND", "sync").lower()
+
 # Basic config validation
 if not OPENAI_API_KEY:
     st.error("❌ OPENAI_API_KEY environment variable is not set. Please configure it in your Render.com service settings.")
     st.stop()
 
+openai_http.configure(OPENAI_API_KEY)
+
 # Define BBR colors
 BBR_BLUE = "#003876"
 BBR_LIGHT_BLUE = "#e8f0f9"
 BBR_GRAY = "#f8f9fa"
 BBR_TEXT = "#333333"
 
+# Start generating the shared auto-intro opener in the background (no-op once fresh)
+opener.get_opener_cache().warm(ASSISTANT_ID)
+
 # Session state bootstrapping
 if "messages" not in st.session_state:
-    st.session_state.messages: List[Dict[str, str]] = []
+    welcome_message = """Hello! I'm the BBR Intelligence Assistant. How can I help you today? For example, ask:
+- “What’s the spec for CMG?” 
+- “Weight of CMI trumplate 1206?” 
+- “Share docs context” (upload a file in the sidebar or mobile expander)."""
+    # Newest turns in memory, older ones spilled to disk (message_store.py)
+    st.session_state.messages = message_store.MessageStore()
+    st.session_state.messages.append("assistant", welcome_message)
 if "file_context" not in st.session_state:
-    st.session_state.file_context: Optional[Dict[str, str]] = None
+    st.session_state.file_context: Optional[Dict[str, Any]] = None
+if "history_limit" not in st.session_state:
+    st.session_state.history_limit = HISTORY_WINDOW
 if "voice_history" not in st.session_state:
     st.session_state.voice_history: List[str] = []
+if "voice_clips" not in st.session_state:
+    # Hashes of recordings already transcribed and sent in this session
+    st.session_state.voice_clips: Set[str] = set()
 
 # -------- File upload + voice helpers --------
-MAX_UPLOAD_MB = 2
-
-
-def _extract_text(uploaded_file) -> Optional[str]:
+# Uploads are spooled to disk and parsed through a memory map in the worker pool
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "25"))
+
+# "retrieval": index the whole document and send only the chunks relevant to each question;
+# "attach": add the document to the thread once and only reference it on later turns;
+# "vector_store": upload to an OpenAI vector store in the background and use file_search
+# (for manuals up to VECTOR_STORE_UPLOAD_MB; the assistant needs file_search enabled);
+# "full": send the first MAX_CONTEXT_CHARS characters with every question
+FILE_CONTEXT_MODE = os.getenv("FILE_CONTEXT_MODE", "retrieval").lower()
+# How often (seconds) the page checks a background vector-store upload for completion
+VECTOR_STORE_POLL_SECONDS = float(os.getenv("VECTOR_STORE_POLL_SECONDS", "3"))
+EXTRACT_BUDGET = {
+    "retrieval": documents.MAX_INDEX_CHARS,
+    "attach": documents.MAX_ATTACH_CHARS,
+}.get(FILE_CONTEXT_MODE, documents.MAX_CONTEXT_CHARS)
+
+
+def _cancel_extraction() -> None:
+    job = st.session_state.get("extract_job")
+    if job is not None and not job.done():
+        job.cancel()
+    st.session_state.extract_job = None
+
+
+def _extract_text(uploaded_file) -> Optional[documents.Extraction]:
+    """Extract the upload's text and make it this session's file context."""
     if uploaded_file is None:
         return None
     size_mb = uploaded_file.size / (1024 * 1024)
     if size_mb > MAX_UPLOAD_MB:
-        st.error(f"File too large ({size_mb:.2f} MB). Max {MAX_UPLOAD_MB} MB.")
+        st.error(f"File too large ({size_mb:.2f} MB). Max {MAX_UPLOAD_MB:g} MB.")
         return None
 
-    name = uploaded_file.name.lower()
+    digest = documents.content_hash(uploaded_file.getbuffer())
+    extraction = documents.cached_extraction(uploaded_file.name, digest, EXTRACT_BUDGET)
+    if extraction is not None:
+        return _set_file_context(uploaded_file.name, digest, extraction)
+    if st.session_state.get("failed_upload") == digest:
+        # The uploader keeps the file across reruns; don't parse it again until it changes
+        st.caption(f"Could not read {uploaded_file.name}; upload a different file.")
+        return None
+
+    # Parse in the process pool; reattach to this session's job if a rerun interrupted the wait
+    job = st.session_state.get("extract_job")
+    if job is None or job.digest != digest:
+        _cancel_extraction()
+        job = documents.submit_extraction(uploaded_file.name, uploaded_file, digest, EXTRACT_BUDGET)
+        st.session_state.extract_job = job
+
+    bar = st.progress(0.0, text=f"Reading {uploaded_file.name}...")
+    while not job.done():
+        if job.timed_out():
+            _cancel_extraction()
+            st.session_state.failed_upload = digest
+            bar.empty()
+            st.error(f"Reading {uploaded_file.name} took too long (>{documents.EXTRACT_TIMEOUT:.0f}s).")
+            return None
+        scanned, total = job.progress()
+        if total:
+            bar.progress(min(scanned / total, 1.0), text=f"Reading {uploaded_file.name}... page {scanned}/{total}")
+        time.sleep(0.2)
+    bar.empty()
+    st.session_state.extract_job = None
+
     try:
-        if name.endswith(".pdf"):
-            reader = PdfReader(uploaded_file)
-            pages = [page.extract_text() or "" for page in reader.pages]
-            return "\n".join(pages)
-        if name.endswith(".docx"):
-            doc = Document(uploaded_file)
-            return "\n".join([p.text for p in doc.paragraphs])
-        content = uploaded_file.read()
-        try:
-            return content.decode("utf-8")
-        except Exception:
-            return content.decode("latin-1", errors="ignore")
+        return _set_file_context(uploaded_file.name, digest, job.result())
+    except documents.ExtractionCancelled:
+        return None
     except Exception as e:
+        st.session_state.failed_upload = digest
         st.error(f"Could not read file: {e}")
         return None
 
 
-def _transcribe_audio(audio_bytes: bytes) -> Optional[str]:
-    if not audio_bytes:
-        return None
+def _index_upload(uploaded_file) -> bool:
+    """Start indexing the upload into a vector store; chat stays usable while it runs."""
+    size_mb = uploaded_file.size / (1024 * 1024)
+    if size_mb > vector_store.VECTOR_STORE_UPLOAD_MB:
+        st.error(f"File too large ({size_mb:.2f} MB). Max {vector_store.VECTOR_STORE_UPLOAD_MB:.0f} MB.")
+        return False
+    digest = documents.content_hash(uploaded_file.getbuffer())
+    ctx = st.session_state.file_context
+    if ctx and ctx["sha256"] == digest:
+        return True
+    st.session_state.vector_upload = vector_store.get_uploader().submit(uploaded_file.name, uploaded_file, digest)
+    st.session_state.file_context = {"name": uploaded_file.name, "sha256": digest, "vector_store_id": None}
+    return True
+
+
+def _vector_store_ready(ctx: Dict[str, Any]) -> bool:
+    """True once the session's upload is indexed; surfaces (and clears) a failed upload."""
+    if ctx.get("vector_store_id"):
+        return True
+    future = st.session_state.get("vector_upload")
+    if future is None or not future.done():
+        return False
+    st.session_state.vector_upload = None
     try:
-        files = {"file": ("audio.wav", audio_bytes, "audio/wav")}
-        data = {"model": "whisper-1"}
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
-        resp = requests.post(
-            "https://api.openai.com/v1/audio/transcriptions",
-            headers=headers,
-            data=data,
-            files=files,
-        )
-        if resp.status_code != 200:
-            st.error(f"Transcription failed: {resp.text}")
-            return None
-        return resp.json().get("text", "").strip()
+        ctx["vector_store_id"] = future.result().vector_store_id
     except Exception as e:
-        st.error(f"Transcription error: {e}")
+        st.session_state.file_context = None
+        st.error(f"Could not index {ctx['name']}: {e}")
+        return False
+    return True
+
+
+def _attach_vector_store(ctx: Dict[str, Any]) -> bool:
+    """Attach the indexed file to this session's thread once; False while still indexing."""
+    if not _vector_store_ready(ctx):
+        return False
+    if st.session_state.get("attached_context") != ctx["sha256"]:
+        try:
+            vector_store.attach_to_thread(ensure_thread(), ctx["vector_store_id"])
+        except Exception as e:
+            st.error(f"Could not attach {ctx['name']}: {e}")
+            return False
+        st.session_state.attached_context = ctx["sha256"]
+    return True
+
+
+def _set_file_context(name: str, digest: str, extraction: documents.Extraction) -> Optional[documents.Extraction]:
+    if not extraction.text:
         return None
+    # Only the hash is kept per session; the text lives in the shared extraction store
+    st.session_state.file_context = {"name": name, "sha256": digest, "budget": EXTRACT_BUDGET, "chars": len(extraction.text)}
+    return extraction
 
-# Function to load and encode image to base64
-def get_image_base64(image_path):
-    if not os.path.exists(image_path):
+
+def _file_text(ctx: Dict[str, Any]) -> Optional[str]:
+    extraction = documents.cached_extraction(ctx["name"], ctx["sha256"], ctx["budget"])
+    if extraction is None:
+        st.session_state.file_context = None
+        st.warning(f"{ctx['name']} is no longer cached; please upload it again.")
         return None
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
-
-# Logo resolution helper
-def resolve_logo_path() -> str:
-    candidates = [
-        "images/BBR_Logo-round.png",
-        "images/BBR_Logo_round.png",
-        "images/BBR_Logo.png",
-    ]
-    for p in candidates:
-        if Path(p).exists():
-            return p
-    return candidates[-1]
-
-# Get BBR logo and background image as base64
-bbr_logo_path = resolve_logo_path()
-ebbr_logo_path = "images/EBBR_logo.png"
-user_avatar_path = "images/user.png"
-bbr_logo_base64 = get_image_base64(bbr_logo_path)
-
-# For Streamlit avatar, we need to use the direct file path, not base64
-assistant_avatar = ebbr_logo_path  # Direct path to image file
-user_avatar = user_avatar_path  # Direct path to user avatar image
-
-st.markdown(f"""
-<style>
-    :root {{
-        --bbr-blue: {BBR_BLUE};
-        --bbr-blue-dark: #0b2c70;
-        --bbr-light: {BBR_LIGHT_BLUE};
-        --bbr-gray: {BBR_GRAY};
-        --bbr-text: {BBR_TEXT};
-        --card: #ffffff;
-        --shadow: 0 12px 32px rgba(0,0,0,0.12);
-    }}
-
-    body, .stApp {{
-        background: linear-gradient(160deg, #f5f7fb 0%, #eef2f8 60%, #f9fbff 100%);
-        color: var(--bbr-text);
-    }}
-
-    header, [data-testid="stHeader"], [data-testid="stToolbar"] {{
-        display: none !important;
-    }}
-
-    .main {{
-        max-width: 1200px !important;
-        padding: 0 !important;
-        margin: 0 auto !important;
-    }}
-
-    .block-container {{
-        padding: 0 18px 120px 18px !important;
-        max-width: 900px !important;
-        margin: 0 auto;
-    }}
-
-    .page-header {{
-        background: var(--bbr-blue-dark);
-        border: none;
-        box-shadow: 0 8px 24px rgba(0,0,0,0.18);
-        height: 70px;
-        border-radius: 14px;
-        width: 100%;
-        display: flex;
-        align-items: center;
-        padding: 0 18px;
-        margin: 18px auto 12px auto;
-        position: sticky;
-        top: 10px;
-        z-index: 1000;
-        backdrop-filter: blur(8px);
-    }}
-
-    .logo-container {{
-        display: flex;
-        align-items: center;
-        gap: 12px;
-    }}
-
-    .header-description {{
-        color: #fff;
-        font-size: 1.08rem;
-        font-weight: 800;
-        letter-spacing: 0.01em;
-    }}
-    .logo-container img {{
-        width: 44px;
-        height: 44px;
-        border-radius: 50%;
-        background: transparent;
-        padding: 0;
-        box-shadow: none;
-        object-fit: contain;
-    }}
-
-    /* Chat area */
-    .stChatFlow {{
-        border: none !important;
-        border-radius: 16px !important;
-        max-width: 100% !important;
-        width: 100% !important;
-        margin: 0 auto 18px auto !important;
-        padding: 18px !important;
-        background: var(--card);
-        box-shadow: var(--shadow);
-        height: calc(100vh - 240px) !important;
-        max-height: calc(100vh - 240px) !important;
-        overflow-y: auto !important;
-    }}
-
-    .stChatFlow::-webkit-scrollbar {{
-        width: 10px;
-    }}
-    .stChatFlow::-webkit-scrollbar-track {{
-        background: #f1f3f9;
-        border-radius: 999px;
-    }}
-    .stChatFlow::-webkit-scrollbar-thumb {{
-        background: var(--bbr-blue);
-        border-radius: 999px;
-    }}
-
-    /* Messages */
-    .stChatMessage {{
-        max-width: 90% !important;
-        margin: 1rem 0 !important;
-        gap: 12px !important;
-    }}
-    .stChatMessage .stAvatar {{
-        box-shadow: 0 4px 18px rgba(0,0,0,0.12);
-    }}
-    .stChatMessage.assistant [data-testid="stMarkdownContainer"] {{
-        background: #ffffff !important;
-        border: 1px solid #e4e9f2 !important;
-        color: var(--bbr-text) !important;
-        border-radius: 14px !important;
-        padding: 0.9rem 1rem !important;
-        box-shadow: 0 4px 16px rgba(0,0,0,0.06) !important;
-    }}
-    .stChatMessage.user [data-testid="stMarkdownContainer"] {{
-        background: linear-gradient(135deg, var(--bbr-blue-dark), #002d79) !important;
-        color: #fff !important;
-        border: none !important;
-        border-radius: 14px 14px 6px 14px !important;
-        padding: 0.95rem 1.05rem !important;
-        box-shadow: 0 6px 16px rgba(0,0,0,0.12) !important;
-    }}
-    .stChatMessage.assistant pre {{
-        background: #f8f9fd !important;
-        border: 1px solid #e6ebf5 !important;
-        border-radius: 10px !important;
-        padding: 0.75rem !important;
-    }}
-
-    /* Input bar - clean rounded design */
-    .stChatFloatingInputContainer {{
-        bottom: 18px !important;
-        width: 100% !important;
-        max-width: 800px !important;
-        margin: 0 auto !important;
-        left: 50% !important;
-        transform: translateX(-50%) !important;
-        position: fixed !important;
-        z-index: 1001 !important;
-        background: #ffffff !important;
-        border: 1px solid #e2e8f0 !important;
-        border-radius: 28px !important;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-        padding: 6px 12px !important;
-    }}
-    .stChatInputContainer {{
-        gap: 8px !important;
-    }}
-    .stChatInputContainer input {{
-        border-radius: 20px !important;
-        border: none !important;
-        padding: 0.75rem 1rem !important;
-        background: transparent !important;
-        color: #374151 !important;
-        font-weight: 500;
-        font-size: 0.95rem;
-    }}
-    .stChatInputContainer input::placeholder {{
-        color: #9ca3af !important;
-    }}
-    .stChatInputContainer input:focus {{
-        outline: none !important;
-        box-shadow: none !important;
-    }}
-    /* Send button */
-    .stChatInputContainer button {{
-        border-radius: 50% !important;
-        background: #e5e7eb !important;
-        color: #6b7280 !important;
-        border: none !important;
-        width: 36px !important;
-        height: 36px !important;
-        min-width: 36px !important;
-        padding: 0 !important;
-        display: flex !important;
-        align-items: center !important;
-        justify-content: center !important;
-        box-shadow: none !important;
-        transition: background 0.2s, color 0.2s;
-    }}
-    .stChatInputContainer button:hover {{
-        background: var(--bbr-blue) !important;
-        color: #fff !important;
-    }}
-
-    /* Sidebar tweaks */
-    section[data-testid="stSidebar"] > div {{
-        background: #f9fbff;
-        border-right: 1px solid #e7edf6;
-    }}
-
-    /* Badges / captions */
-    .stCaption {{
-        color: #5a6880 !important;
-    }}
-
-    /* Emphasis styling */
-    .stMarkdown strong,
-    .stMarkdown b {{
-        color: var(--bbr-blue);
-        font-weight: 800;
-    }}
-    .stMarkdown em,
-    .stMarkdown i {{
-        color: var(--bbr-blue);
-        font-style: normal;
-        font-weight: 700;
-    }}
-    .stMarkdown mark {{
-        background: #fff3c4;
-        padding: 0 4px;
-        border-radius: 4px;
-    }}
-    .stMarkdown ul li {{
-        border-left: 3px solid rgba(0,45,121,0.12);
-        padding-left: 10px;
-        margin-bottom: 6px;
-    }}
-
-    /* File context badge - inline above input */
-    .file-context-badge {{
-        display: inline-flex;
-        align-items: center;
-        background: #f0f9ff;
-        border: 1px solid #bae6fd;
-        color: #0369a1;
-        padding: 6px 14px;
-        border-radius: 20px;
-        font-size: 0.85rem;
-        gap: 8px;
-        margin-bottom: 8px;
-    }}
-
-    /* Hide sidebar completely */
-    section[data-testid="stSidebar"] {{
-        display: none !important;
-    }}
-    button[data-testid="stSidebarCollapsedControl"] {{
-        display: none !important;
-    }}
-
-    /* Mobile tweaks */
-    @media (max-width: 768px) {{
-        .page-header {{
-            margin: 10px auto 6px auto;
-            padding: 0 10px;
-            height: 56px;
-            border-radius: 12px;
-        }}
-        .logo-container img {{
-            height: 36px;
-            width: 36px;
-        }}
-        .header-description {{
-            font-size: 0.95rem;
-        }}
-        .block-container {{
-            padding: 0 10px 160px 10px !important;
-        }}
-        .stChatFlow {{
-            height: calc(100vh - 260px) !important;
-            padding: 12px !important;
-        }}
-        .stChatMessage {{
-            max-width: 100% !important;
-            margin: 0.85rem 0 !important;
-        }}
-        .stChatMessage.assistant [data-testid="stMarkdownContainer"],
-        .stChatMessage.user [data-testid="stMarkdownContainer"] {{
-            padding: 0.75rem 0.85rem !important;
-            font-size: 0.95rem !important;
-        }}
-        .stChatFloatingInputContainer {{
-            bottom: 10px !important;
-            left: 10px !important;
-            right: 10px !important;
-            width: auto !important;
-            max-width: none !important;
-            transform: none !important;
-            padding: 6px 10px !important;
-            border-radius: 24px !important;
-        }}
-        .stChatInputContainer input {{
-            padding: 0.65rem 0.85rem !important;
-            font-size: 0.9rem !important;
-        }}
-        .stChatInputContainer button {{
-            width: 32px !important;
-            height: 32px !important;
-            min-width: 32px !important;
-        }}
-        .file-context-badge {{
-            font-size: 0.8rem;
-            padding: 5px 12px;
-        }}
-    }}
-</style>
-
-<script>
-// JAVASCRIPT TO FORCE SCROLLING
-document.addEventListener('DOMContentLoaded', function() {{
-    function forceScrolling() {{
-        // Find the chat flow container
-        const chatFlow = document.querySelector('.stChatFlow');
-        if (chatFlow) {{
-            // Force scrolling properties
-            chatFlow.style.overflowY = 'scroll';
-            chatFlow.style.overflowX = 'hidden';
-            chatFlow.style.height = 'calc(100vh - 200px)';
-            chatFlow.style.maxHeight = 'calc(100vh - 200px)';
-            
-            // Scroll to bottom when new messages appear
-            chatFlow.scrollTop = chatFlow.scrollHeight;
-        }}
-        
-        // Also try to find any other potential containers
-        const containers = document.querySelectorAll('[data-testid="stChatFlow"], .stChatFlow');
-        containers.forEach(container => {{
-            container.style.overflowY = 'scroll';
-            container.style.overflowX = 'hidden';
-            container.style.height = 'calc(100vh - 200px)';
-            container.style.maxHeight = 'calc(100vh - 200px)';
-        }});
-    }}
-    
-    // Run immediately
-    forceScrolling();
-    
-    // Run every second to catch dynamic changes
-    setInterval(forceScrolling, 1000);
-    
-    // Run when DOM changes
-    const observer = new MutationObserver(forceScrolling);
-    observer.observe(document.body, {{ childList: true, subtree: true }});
-}});
-</script>
-""", unsafe_allow_html=True)
+    return extraction.text
+
+
+def _context_builder(ctx: Optional[Dict[str, Any]]) -> Callable[[str], str]:
+    """
+    Resolve the session's file context on the script thread (attachments, text lookup) and
+    return a prompt -> context suffix function that is safe to call from worker threads.
+    """
+    if not ctx:
+        return lambda prompt: ""
+    name = ctx["name"]
+    if FILE_CONTEXT_MODE == "vector_store":
+        if not _attach_vector_store(ctx):
+            st.caption(f"⏳ Still indexing {name}; answering without it.")
+            return lambda prompt: ""
+        return lambda prompt: f"\n\n[Search the attached file: {name}]"
+    if FILE_CONTEXT_MODE == "attach":
+        return lambda prompt: f"\n\n[Refer to the attached file: {name}]"
+    text = _file_text(ctx)
+    if text is None:
+        return lambda prompt: ""
+    if FILE_CONTEXT_MODE != "retrieval":
+        return lambda prompt: f"\n\n[File context: {name}]\n{text[:documents.MAX_CONTEXT_CHARS]}"
+
+    def excerpts(prompt: str) -> str:
+        body = "\n---\n".join(retrieval.relevant_context(ctx["sha256"], text, prompt))
+        return f"\n\n[File context: {name} (relevant excerpts)]\n{body}"
+
+    return excerpts
+
+
+def _pending_attachment(ctx: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+    """
+    In attach mode, the (sha256, message) that adds the document to the thread, unless the
+    thread already holds this exact content. Re-sent when the file hash or the thread changes.
+    """
+    if FILE_CONTEXT_MODE != "attach" or not ctx:
+        return None
+    if st.session_state.get("attached_context") == ctx["sha256"]:
+        return None
+    text = _file_text(ctx)
+    if text is None:
+        return None
+    return ctx["sha256"], f"[File context: {ctx['name']}]\n{text}"
+
+
+def _describe_extraction(name: str, extraction: documents.Extraction) -> str:
+    pages = f"{extraction.pages_scanned}/{extraction.total_pages}" if extraction.total_pages else str(extraction.pages_scanned)
+    note = ", truncated to context limit" if extraction.truncated else ""
+    return f"Loaded {name} ({len(extraction.text)} chars from {pages} sections in {extraction.seconds:.2f}s{note})"
+
+
+# Logo, avatars and CSS/JS are loaded once per process (assets.py)
+assistant_avatar = assets.assistant_avatar()
+user_avatar = assets.user_avatar()
+assets.inject()
+
+# -------- Persistence (optional) --------
+# supabase_client.get_client() is a process-wide pooled client shared by every session
+
+def _db_session_id() -> Optional[str]:
+    """Lazily create the Supabase sessions row for this chat when persistence is on."""
+    if not PERSIST_CHATS:
+        return None
+    if "db_session_id" not in st.session_state:
+        try:
+            row = supabase_client.create_session(supabase_client.get_client(), user_id=None, client_info="streamlit")
+            st.session_state.db_session_id = row["id"]
+        except Exception as e:
+            supabase_client.report_failure(e)
+            st.toast(f"Chat persistence unavailable: {e}")
+            st.session_state.db_session_id = None
+    return st.session_state.db_session_id
+
+
+def _persist_message(role: str, content: str) -> None:
+    session_id = _db_session_id()
+    if not session_id:
+        return
+    try:
+        # Queued for the background writer; raises only when the queue stays full
+        supabase_client.save_message(session_id, None, role, content)
+    except Exception as e:
+        st.toast(f"Could not save message: {e}")
+
+
+def _create_thread(messages: Sequence[Tuple[str, str]] = ()) -> str:
+    if OPENAI_BACKEND == "async":
+        return async_backend.get_backend().create_thread_blocking(messages)
+    return assistant_client.create_thread(messages)
+
+
+def _thread_factory() -> Callable[[], str]:
+    """
+    Create this session's thread, seeded with turns answered from the cache before it existed
+    (so a follow-up still has its subject); safe to call from worker threads.
+    """
+    unsent = list(st.session_state.get("unsent_turns") or ())
+    return lambda: _create_thread(unsent)
+
+
+def ensure_thread() -> str:
+    """Create the OpenAI thread once per chat session and reuse it for every turn."""
+    thread_id = st.session_state.get("thread_id")
+    if thread_id:
+        return thread_id
+    return _adopt_thread(_thread_factory()())
+
+
+def _adopt_thread(thread_id: str) -> str:
+    """Make thread_id this session's thread (no-op if it already is)."""
+    if st.session_state.get("thread_id") == thread_id:
+        return thread_id
+    st.session_state.thread_id = thread_id
+    st.session_state.attached_context = None
+    # Every new thread is created with these already in it
+    st.session_state.unsent_turns = []
+    session_id = _db_session_id()
+    if session_id:
+        try:
+            supabase_client.set_session_thread(supabase_client.get_client(), session_id, thread_id)
+        except Exception as e:
+            supabase_client.report_failure(e)
+            st.toast(f"Could not save thread id: {e}")
+    return thread_id
+
 
 # Direct API implementation using v2 of the API
-def query_openai_assistant(user_query):
+def ask_assistant(user_query, context_messages: Sequence[str] = (), thread_id: Optional[str] = None) -> str:
+    """Run one turn on this session's thread (or the given one); raises on failure."""
+    thread_id = thread_id or ensure_thread()
+    if OPENAI_BACKEND == "async":
+        return async_backend.get_backend().run_turn_blocking(ASSISTANT_ID, thread_id, user_query, context_messages)
+    return assistant_client.run_turn(ASSISTANT_ID, thread_id, user_query, context_messages)
+
+
+def stream_turn(user_query, context_messages: Sequence[str], thread_id: str) -> Iterator[str]:
+    """Stream one turn on the configured backend; raises StreamUnavailable before anything is sent."""
+    if OPENAI_BACKEND == "async":
+        return async_backend.get_backend().stream_turn_blocking(ASSISTANT_ID, thread_id, user_query, context_messages)
+    return assistant_client.stream_turn(ASSISTANT_ID, thread_id, user_query, context_messages)
+
+
+def query_openai_assistant(user_query, context_messages: Sequence[str] = ()):
     """
-    Query the OpenAI assistant using direct HTTP requests with v2 API.
+    Query the OpenAI assistant on this session's thread using direct HTTP requests with v2 API.
     """
+    st.session_state.last_turn_error = None
     try:
-        # Step 1: Create a thread
-        thread_response = requests.post(
-            "https://api.openai.com/v1/threads",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-                "OpenAI-Beta": "assistants=v2"  # Using v2 API
-            },
-            json={}
-        )
-        
-        if thread_response.status_code != 200:
-            return f"Error creating thread: {thread_response.status_code} - {thread_response.text}"
-        
-        thread_id = thread_response.json()["id"]
-        
-        # Step 2: Add user message to thread
-        message_response = requests.post(
-            f"https://api.openai.com/v1/threads/{thread_id}/messages",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-                "OpenAI-Beta": "assistants=v2"
-            },
-            json={
-                "role": "user",
-                "content": user_query
-            }
-        )
-        
-        if message_response.status_code != 200:
-            return f"Error adding message: {message_response.status_code} - {message_response.text}"
-        
-        # Step 3: Create run
-        run_response = requests.post(
-            f"https://api.openai.com/v1/threads/{thread_id}/runs",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-                "OpenAI-Beta": "assistants=v2"
-            },
-            json={
-                "assistant_id": ASSISTANT_ID
-            }
-        )
-        
-        if run_response.status_code != 200:
-            return f"Error creating run: {run_response.status_code} - {run_response.text}"
-        
-        run_id = run_response.json()["id"]
-        
-        # Step 4: Poll for completion
-        import time
-        max_attempts = 30  # 30 seconds max
-        for attempt in range(max_attempts):
-            run_status_response = requests.get(
-                f"https://api.openai.com/v1/threads/{thread_id}/runs/{run_id}",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "OpenAI-Beta": "assistants=v2"
-                }
-            )
-            
-            if run_status_response.status_code != 200:
-                return f"Error checking run status: {run_status_response.status_code} - {run_status_response.text}"
-            
-            run_status = run_status_response.json()["status"]
-            
-            if run_status == "completed":
-                break
-            elif run_status in ["failed", "cancelled", "expired"]:
-                return f"Run failed with status: {run_status}"
-            
-            time.sleep(1)  # Wait 1 second before next check
-        else:
-            return "Timeout waiting for assistant response"
-        
-        # Step 5: Get messages
-        messages_response = requests.get(
-            f"https://api.openai.com/v1/threads/{thread_id}/messages",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "OpenAI-Beta": "assistants=v2"
-            }
-        )
-        
-        if messages_response.status_code != 200:
-            return f"Error retrieving messages: {messages_response.status_code} - {messages_response.text}"
-        
-        messages = messages_response.json()["data"]
-        
-        # Get the assistant's latest response
-        for message in messages:
-            if message["role"] == "assistant":
-                content = message["content"][0]
-                if content["type"] == "text":
-                    return content["text"]["value"]
-        
-        return "No response from assistant"
-        
+        return ask_assistant(user_query, context_messages)
     except Exception as e:
+        st.session_state.last_turn_error = str(e)
         return f"Error querying assistant: {str(e)}"
 
+
+def stream_openai_assistant(user_query, context_messages: Sequence[str] = ()):
+    """
+    Stream the assistant's answer for st.write_stream, falling back to polling if the stream cannot be opened.
+    """
+    st.session_state.last_turn_error = None
+    received = False
+    try:
+        thread_id = ensure_thread()
+        for chunk in stream_turn(user_query, context_messages, thread_id):
+            received = True
+            yield chunk
+    except assistant_client.StreamUnavailable:
+        received = True
+        yield query_openai_assistant(user_query, context_messages)
+    except Exception as e:
+        received = True
+        st.session_state.last_turn_error = str(e)
+        yield f"\n\nError querying assistant: {str(e)}"
+    if not received:
+        st.session_state.last_turn_error = "No response from assistant"
+        yield "No response from assistant"
+
+
+def _answer_chunks(thread_id: str, turn: Dict[str, Any]) -> Iterator[str]:
+    """Answer text for a prepared turn without touching session state (used off the script thread)."""
+    if turn["cached"] is not None:
+        yield turn["cached"]
+        return
+    if STREAM_RESPONSES:
+        try:
+            yield from stream_turn(turn["final_prompt"], turn["context_messages"], thread_id)
+            return
+        except assistant_client.StreamUnavailable:
+            pass
+    yield ask_assistant(turn["final_prompt"], turn["context_messages"], thread_id)
+
 # Sidebar inputs
 def render_sidebar_inputs():
     with st.sidebar:
         st.subheader("Context & input")
 
-        uploaded = st.file_uploader("Upload file (pdf, docx, txt, <=2MB)", type=["pdf", "docx", "txt"])
+        uploaded = st.file_uploader(f"Upload file (pdf, docx, txt, <={MAX_UPLOAD_MB:g}MB)", type=["pdf", "docx", "txt"])
         if uploaded:
-            text = _extract_text(uploaded)
-            if text:
-                st.session_state.file_context = {"name": uploaded.name, "text": text[:12000]}
-                st.success(f"Loaded {uploaded.name} ({len(text)} chars)")
+            extraction = _extract_text(uploaded)
+            if extraction:
+                st.success(_describe_extraction(uploaded.name, extraction))
         if st.session_state.file_context:
             st.info(f"Using context: {st.session_state.file_context['name']}")
             if st.button("Clear context"):
@@ -601,27 +443,20 @@ def render_sidebar_inputs():
         st.markdown("---")
         st.caption("Voice input (hold to record)")
         audio_bytes = audio_recorder(text="🎤 Hold to record", pause_threshold=2.0, sample_rate=16000)
-        if audio_bytes:
-            with st.spinner("Transcribing..."):
-                transcript = _transcribe_audio(audio_bytes)
-            if transcript:
-                st.session_state.voice_history.append(transcript)
-                st.success("Voice captured. Sending...")
-                process_user_message(transcript)
+        process_voice_message(audio_bytes)
         if st.session_state.voice_history:
             st.caption("Recent transcripts")
-            for t in st.session_state.voice_history[-3:][::-1]:
+            for t in st.session_state.voice_history[::-1]:
                 st.write(f"• {t}")
 
 
 def render_mobile_inputs():
     with st.expander("Uploads & voice (mobile)", expanded=False):
-        uploaded = st.file_uploader("Upload file (pdf, docx, txt, <=2MB)", type=["pdf", "docx", "txt"], key="mobile_file")
+        uploaded = st.file_uploader(f"Upload file (pdf, docx, txt, <={MAX_UPLOAD_MB:g}MB)", type=["pdf", "docx", "txt"], key="mobile_file")
         if uploaded:
-            text = _extract_text(uploaded)
-            if text:
-                st.session_state.file_context = {"name": uploaded.name, "text": text[:12000]}
-                st.success(f"Loaded {uploaded.name} ({len(text)} chars)")
+            extraction = _extract_text(uploaded)
+            if extraction:
+                st.success(_describe_extraction(uploaded.name, extraction))
         if st.session_state.file_context:
             st.info(f"Using context: {st.session_state.file_context['name']}")
             if st.button("Clear context", key="mobile_clear_context"):
@@ -629,90 +464,70 @@ def render_mobile_inputs():
 
         st.caption("Voice input (hold to record)")
         audio_bytes = audio_recorder(text="🎤 Hold to record", pause_threshold=2.0, sample_rate=16000, key="mobile_audio")
-        if audio_bytes:
-            with st.spinner("Transcribing..."):
-                transcript = _transcribe_audio(audio_bytes)
-            if transcript:
-                st.session_state.voice_history.append(transcript)
-                st.success("Voice captured. Sending...")
-                process_user_message(transcript)
+        process_voice_message(audio_bytes)
         if st.session_state.voice_history:
             st.caption("Recent transcripts")
-            for t in st.session_state.voice_history[-3:][::-1]:
+            for t in st.session_state.voice_history[::-1]:
                 st.write(f"• {t}")
 
 
+def _in_fragment_rerun() -> bool:
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+
+def _rerun_fragment() -> None:
+    """Rerun just the calling fragment; a fragment-scoped rerun is only valid during a fragment run."""
+    st.rerun(scope="fragment" if _in_fragment_rerun() else "app")
+
+
+def _sync_history() -> None:
+    """
+    A turn sent from a fragment is drawn inside that fragment; rerun the app once so the
+    history fragment picks it up instead of showing it twice.
+    """
+    if _in_fragment_rerun():
+        st.rerun()
+
+
+def _toggle_tools() -> None:
+    st.session_state.show_tools = not st.session_state.show_tools
+
+
+def _clear_file_context() -> None:
+    _cancel_extraction()
+    st.session_state.file_context = None
+    st.session_state.vector_upload = None
+
+
+@st.fragment
 def render_inline_input_icons():
-    """Clean interface - file/voice tools hidden in a minimal toggle."""
+    """Clean interface - file/voice tools hidden in a minimal toggle (reruns on its own)."""
     
-    # Show file context badge if a file is loaded
+    # Show file context badge if a file is loaded (a finished background upload is picked up here)
+    if st.session_state.file_context and st.session_state.get("vector_upload") is not None:
+        _vector_store_ready(st.session_state.file_context)
     if st.session_state.file_context:
         fname = st.session_state.file_context["name"]
+        if st.session_state.get("vector_upload") is not None:
+            fname += " (indexing…)"
         st.markdown(f"""
         <div style="display:inline-flex;align-items:center;background:#e0f2fe;border:1px solid #7dd3fc;
         color:#0369a1;padding:4px 12px;border-radius:16px;font-size:0.85rem;margin-bottom:8px;gap:8px;">
             📎 {fname}
         </div>
         """, unsafe_allow_html=True)
-        if st.button("✕ Clear", key="clear_file_ctx"):
-            st.session_state.file_context = None
-            st.rerun()
+        st.button("✕ Clear", key="clear_file_ctx", on_click=_clear_file_context)
     
     # Initialize toggle state
     if "show_tools" not in st.session_state:
         st.session_state.show_tools = False
     
-    # Small toggle button for tools - positioned at bottom
-    st.markdown("""
-    <style>
-    .tools-toggle {
-        position: fixed;
-        bottom: 75px;
-        left: 50%;
-        transform: translateX(-50%);
-        z-index: 1002;
-    }
-    .tools-toggle button {
-        background: #f3f4f6 !important;
-        border: 1px solid #e5e7eb !important;
-        border-radius: 20px !important;
-        padding: 6px 14px !important;
-        font-size: 0.85rem !important;
-        color: #6b7280 !important;
-        cursor: pointer;
-        transition: all 0.2s;
-    }
-    .tools-toggle button:hover {
-        background: #e5e7eb !important;
-        color: #374151 !important;
-    }
-    .tools-panel {
-        position: fixed;
-        bottom: 115px;
-        left: 50%;
-        transform: translateX(-50%);
-        background: white;
-        border: 1px solid #e5e7eb;
-        border-radius: 16px;
-        padding: 16px;
-        box-shadow: 0 8px 24px rgba(0,0,0,0.12);
-        z-index: 1003;
-        max-width: 400px;
-        width: 90vw;
-    }
-    @media (max-width: 768px) {
-        .tools-toggle { bottom: 65px; }
-        .tools-panel { bottom: 105px; }
-    }
-    </style>
-    """, unsafe_allow_html=True)
     
     # Toggle button
     col1, col2, col3 = st.columns([1, 1, 1])
     with col2:
-        if st.button("📎 🎤 Tools" if not st.session_state.show_tools else "✕ Close", key="toggle_tools"):
-            st.session_state.show_tools = not st.session_state.show_tools
-            st.rerun()
+        st.button("📎 🎤 Tools" if not st.session_state.show_tools else "✕ Close", key="toggle_tools", on_click=_toggle_tools)
     
     # Show tools panel only when toggled
     uploaded = None
@@ -738,93 +553,257 @@ def render_inline_input_icons():
                 key="panel_audio",
             )
     
-    # Process uploaded file
-    if uploaded:
-        text = _extract_text(uploaded)
-        if text:
-            st.session_state.file_context = {"name": uploaded.name, "text": text[:12000]}
+    # Process uploaded file (clearing the uploader cancels a parse still in progress)
+    if st.session_state.show_tools and uploaded is None:
+        # Removing the file also allows the same file to be tried again
+        st.session_state.failed_upload = None
+        if st.session_state.get("extract_job"):
+            _cancel_extraction()
+    if uploaded and FILE_CONTEXT_MODE == "vector_store":
+        if _index_upload(uploaded):
             st.session_state.show_tools = False
-            st.toast(f"📎 Loaded {uploaded.name}")
-            st.rerun()
+            st.toast(f"📎 Indexing {uploaded.name} in the background; you can keep chatting")
+            _rerun_fragment()
+    elif uploaded:
+        extraction = _extract_text(uploaded)
+        if extraction:
+            st.session_state.show_tools = False
+            st.toast(f"📎 {_describe_extraction(uploaded.name, extraction)}")
+            _rerun_fragment()
 
     # Process voice input
-    if audio_bytes:
-        with st.spinner("Transcribing..."):
-            transcript = _transcribe_audio(audio_bytes)
-        if transcript:
-            st.session_state.voice_history.append(transcript)
-            st.session_state.show_tools = False
-            st.toast("🎤 Voice captured")
-            process_user_message(transcript)
+    if audio_bytes and process_voice_message(audio_bytes):
+        st.session_state.show_tools = False
+        _sync_history()
 
 
-def process_user_message(prompt: str):
-    if not prompt:
-        return
-    context = ""
-    if st.session_state.file_context:
-        ctx = st.session_state.file_context
-        context = f"\n\n[File context: {ctx['name']}]\n{ctx['text']}"
-    final_prompt = prompt + context
+def _is_first_turn() -> bool:
+    """True until this session sends its first message (the opener is not a turn on the thread)."""
+    if st.session_state.get("thread_id"):
+        return False
+    return not any(m.role == "user" for m in st.session_state.messages)
+
+
+@st.fragment(run_every=VECTOR_STORE_POLL_SECONDS)
+def watch_vector_upload() -> None:
+    """Rendered only while an upload is indexing; reruns the page once it has finished."""
+    upload = st.session_state.get("vector_upload")
+    if upload is None or upload.done():
+        st.rerun()
+
+
+def _prepare_turn() -> Callable[[str], Dict[str, Any]]:
+    """
+    Snapshot this session's file context and return a function mapping a prompt to its turn
+    (final prompt, context messages, cache lookup); the function is safe on worker threads.
+    """
+    ctx = st.session_state.file_context
+    context_for = _context_builder(ctx)
+    attachment = _pending_attachment(ctx)
+    first_turn = _is_first_turn()
+
+    def plan(prompt: str) -> Dict[str, Any]:
+        context = context_for(prompt)
+        # Cached answers (exact, then near-duplicate) are only reused for the opening prompt of a
+        # conversation without file context; later answers depend on the thread's history
+        cacheable = first_turn and not (context or attachment)
+        cache_key = caching.answer_key(prompt, ASSISTANT_ID) if cacheable else None
+        cached = caching.get_answer_cache().get(cache_key) if cache_key else None
+        use_semantic = cacheable and semantic_cache.SEMANTIC_CACHE_ENABLED
+        if cached is None and use_semantic:
+            hit = semantic_cache.get_semantic_cache(ASSISTANT_ID).lookup(prompt)
+            if hit:
+                cached = hit[0]
+        return {
+            "prompt": prompt,
+            "final_prompt": prompt + context,
+            "context_messages": [attachment[1]] if attachment else [],
+            "attachment": attachment[0] if attachment else None,
+            "cache_key": cache_key,
+            "use_semantic": use_semantic,
+            "cached": cached,
+        }
+
+    return plan
 
-    st.session_state.messages.append({"role": "user", "content": prompt})
 
+def _show_user_message(prompt: str) -> None:
+    st.session_state.messages.append("user", prompt)
+    # Back to the newest page, releasing turns paged in by "Load earlier messages"
+    st.session_state.history_limit = HISTORY_WINDOW
+    _persist_message("user", prompt)
     with st.chat_message("user", avatar=user_avatar):
         st.markdown(prompt)
 
+
+def _finish_turn(turn: Optional[Dict[str, Any]], response: str) -> None:
+    """Record the answer; turn is None when preparing a voice turn failed."""
+    ok = turn is not None and not st.session_state.get("last_turn_error")
+    if ok and turn["attachment"]:
+        st.session_state.attached_context = turn["attachment"]
+
+    if ok and turn["cache_key"] and turn["cached"] is None:
+        caching.get_answer_cache().put(turn["cache_key"], response)
+        if turn["use_semantic"]:
+            semantic_cache.remember(ASSISTANT_ID, turn["prompt"], response)
+
+    if turn is not None and turn["cached"] is not None:
+        # No run was made: the thread (created on the next real turn) still needs this exchange
+        st.session_state.unsent_turns = [("user", turn["prompt"]), ("assistant", response)]
+
+    st.session_state.messages.append("assistant", response)
+    _persist_message("assistant", response)
+
+
+def process_user_message(prompt: str):
+    if not prompt:
+        return
+    turn = _prepare_turn()(prompt)
+    _show_user_message(prompt)
+
+    st.session_state.last_turn_error = None
     with st.chat_message("assistant", avatar=assistant_avatar):
-        with st.spinner("Thinking..."):
-            response = query_openai_assistant(final_prompt)
-        st.markdown(response)
-
-    st.session_state.messages.append({"role": "assistant", "content": response})
-
-    st.markdown("""
-    <script>
-    setTimeout(function() {
-        const chatFlow = document.querySelector('.stChatFlow');
-        if (chatFlow) {
-            chatFlow.scrollTop = chatFlow.scrollHeight;
-        }
-    }, 100);
-    </script>
-    """, unsafe_allow_html=True)
+        if turn["cached"] is not None:
+            response = turn["cached"]
+            st.markdown(response)
+        elif STREAM_RESPONSES:
+            response = st.write_stream(stream_openai_assistant(turn["final_prompt"], turn["context_messages"]))
+        else:
+            with st.spinner("Thinking..."):
+                response = query_openai_assistant(turn["final_prompt"], turn["context_messages"])
+            st.markdown(response)
 
-# Initialize session state defaults
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-    welcome_message = """Hello! I'm the BBR Intelligence Assistant. How can I help you today? For example, ask:
-- “What’s the spec for CMG?” 
-- “Weight of CMI trumplate 1206?” 
-- “Share docs context” (upload a file in the sidebar or mobile expander)."""
-    st.session_state.messages.append({"role": "assistant", "content": welcome_message})
+    _finish_turn(turn, response)
+
+
+def _voice_answer(turn: voice_pipeline.VoiceTurn) -> Iterator[str]:
+    st.session_state.last_turn_error = None
+    received = False
+    try:
+        for chunk in turn.answer():
+            received = True
+            yield chunk
+    except Exception as e:
+        received = True
+        st.session_state.last_turn_error = str(e)
+        yield f"\n\nError querying assistant: {str(e)}"
+    if not received:
+        st.session_state.last_turn_error = "No response from assistant"
+        yield "No response from assistant"
+
+
+def process_voice_message(audio_bytes: bytes) -> bool:
+    """
+    Transcribe a new recording and answer it. Transcription, thread creation and the
+    assistant run happen on worker threads; this only shows the transcript and streams
+    the answer. audio_recorder returns the last clip again on every rerun, so clips already
+    handled in this session are ignored. Returns True if a message was sent.
+    """
+    if not audio_bytes:
+        return False
+    digest = transcription.audio_hash(audio_bytes)
+    if digest in st.session_state.voice_clips:
+        return False
+    st.session_state.voice_clips.add(digest)
+
+    # Resolve the file context first: attaching an indexed upload creates the session's thread
+    prepare = _prepare_turn()
+    turn = voice_pipeline.VoiceTurn(
+        audio_bytes,
+        digest,
+        thread_id=st.session_state.get("thread_id"),
+        create_thread=_thread_factory(),
+        prepare=prepare,
+        respond=_answer_chunks,
+    )
+    try:
+        with st.spinner("Transcribing..."):
+            transcript = turn.transcript()
+    except Exception as e:
+        st.error(f"Transcription error: {e}")
+        return False
+    if not transcript:
+        st.toast("🎤 No speech detected")
+        return False
+
+    st.session_state.voice_history.append(transcript)
+    del st.session_state.voice_history[:-VOICE_HISTORY_SHOWN]
+    _show_user_message(transcript)
+    try:
+        with st.chat_message("assistant", avatar=assistant_avatar):
+            if STREAM_RESPONSES:
+                response = st.write_stream(_voice_answer(turn))
+            else:
+                with st.spinner("Thinking..."):
+                    response = "".join(_voice_answer(turn))
+                st.markdown(response)
+    finally:
+        # A rerun mid-answer abandons the stream: stop the worker's run, but keep its thread
+        turn.cancel()
+        if turn.thread_id:
+            _adopt_thread(turn.thread_id)
+    _finish_turn(turn.plan, response)
+    return True
 
 # Create fixed header
-st.markdown(f"""
-<div class="page-header">
-    <div class="logo-container">
-        <img src="data:image/png;base64,{bbr_logo_base64}" alt="BBR Logo" style="height: 50px; margin-right: 15px;">
-        <div class="header-description">BBR Intelligence</div>
+@st.fragment
+def render_header() -> None:
+    st.markdown(f"""
+    <div class="page-header">
+        <div class="logo-container">
+            <img src="{assets.logo_data_uri()}" alt="BBR Logo" style="height: 50px; margin-right: 15px;">
+            <div class="header-description">BBR Intelligence</div>
+        </div>
     </div>
-</div>
-""", unsafe_allow_html=True)
-
-# Display chat messages
-for message in st.session_state.messages:
-    if message["role"] == "user":
-        with st.chat_message(message["role"], avatar=user_avatar):
-            st.markdown(message["content"])
-    else:
-        with st.chat_message(message["role"], avatar=assistant_avatar):
-            st.markdown(message["content"])
-
-# Chat input
+    """, unsafe_allow_html=True)
+
+
+def _load_earlier() -> None:
+    st.session_state.history_limit += HISTORY_WINDOW
+
+
+@st.fragment
+def render_history() -> None:
+    """
+    Render the newest history_limit messages; reruns cost O(window), not O(conversation).
+    "Load earlier messages" reruns only this fragment and pages spilled turns back in.
+    """
+    messages = st.session_state.messages
+    limit = st.session_state.history_limit
+    try:
+        messages.page_in(limit)
+    except sqlite3.Error as e:
+        st.toast(f"Could not load earlier messages: {e}")
+    hidden = messages.hidden(limit)
+    if hidden > 0:
+        st.button(f"Load earlier messages ({hidden} more)", key="load_earlier", on_click=_load_earlier)
+    for message in messages.window(limit):
+        avatar = user_avatar if message.role == "user" else assistant_avatar
+        with st.chat_message(message.role, avatar=avatar):
+            st.markdown(message.content)
+
+
+# The page is split into fragments: widgets inside one rerun only that fragment, so
+# opening the tools panel or paging history doesn't re-execute the rest of the script.
+# A full rerun happens on first load and after each sent message.
+render_header()
+
+if len(st.session_state.messages) == 1:
+    # Auto-start a conversation with the shared opener (generated once per process, not per visitor)
+    opener_text = opener.get_opener_cache().get(ASSISTANT_ID)
+    if opener_text:
+        st.session_state.messages.append("assistant", opener_text)
+        _persist_message("assistant", opener_text)
+
+render_history()
+
+# Chat input stays at the top level: inside a fragment Streamlit draws it inline instead of
+# pinning it to the bottom of the page. Sending reruns the whole script, after the history.
 if prompt := st.chat_input("Ask a question about BBR technologies..."):
     process_user_message(prompt)
-elif len(st.session_state.messages) == 1:
-    # Auto-start a conversation by posing a gentle opener
-    auto_prompt = "Please briefly introduce yourself and how you can help with BBR products and specs."
-    process_user_message(auto_prompt)
 
 # Inline input icons (mic left, upload right) - hidden widgets with visible icon overlays
-render_inline_input_icons()
\ No newline at end of file
+render_inline_input_icons()
+
+if st.session_state.get("vector_upload") is not None:
+    watch_vector_upload()
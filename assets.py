@@ -0,0 +1,91 @@
+"""
+Static assets for the chat UI, loaded once per process.
+Logos and avatars are read, downscaled to their display size and encoded once;
+the stylesheet and script live in static/ and are linked into the page by a
+zero-height component under a content-hash version, so the browser caches them
+and reruns send a short component call instead of the whole CSS/JS block.
+"""
+
+import base64
+import hashlib
+import io
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import streamlit.components.v1 as components
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+STATIC_DIR = ROOT / "static"
+IMAGES_DIR = ROOT / "images"
+
+STYLESHEETS = ("app.css",)
+SCRIPTS = ("scroll_manager.js",)
+
+_loader = components.declare_component("app_assets", path=str(STATIC_DIR))
+
+
+@lru_cache(maxsize=None)
+def resolve_logo_path() -> Path:
+    candidates = [
+        IMAGES_DIR / "BBR_Logo-round.png",
+        IMAGES_DIR / "BBR_Logo_round.png",
+        IMAGES_DIR / "BBR_Logo.png",
+    ]
+    for p in candidates:
+        if p.exists():
+            return p
+    return candidates[-1]
+
+
+@lru_cache(maxsize=None)
+def image_bytes(path: Path, max_px: Optional[int] = None) -> Optional[bytes]:
+    """PNG bytes of an image, downscaled to fit max_px (the 4k logo is shown at 50px)."""
+    if not path.exists():
+        return None
+    if max_px is None:
+        return path.read_bytes()
+    with Image.open(path) as img:
+        img.thumbnail((max_px, max_px))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=None)
+def image_data_uri(path: Path, max_px: Optional[int] = None) -> Optional[str]:
+    data = image_bytes(path, max_px)
+    if data is None:
+        return None
+    return "data:image/png;base64," + base64.b64encode(data).decode()
+
+
+@lru_cache(maxsize=None)
+def versioned(name: str) -> str:
+    """name?v=<first 12 hex chars of the file's SHA-256>."""
+    digest = hashlib.sha256((STATIC_DIR / name).read_bytes()).hexdigest()[:12]
+    return f"{name}?v={digest}"
+
+
+def logo_data_uri() -> Optional[str]:
+    # 2x the 50px header height for high-DPI screens
+    return image_data_uri(resolve_logo_path(), 100)
+
+
+def assistant_avatar() -> Optional[bytes]:
+    return image_bytes(IMAGES_DIR / "EBBR_logo.png", 96)
+
+
+def user_avatar() -> Optional[bytes]:
+    return image_bytes(IMAGES_DIR / "user.png", 96)
+
+
+def inject() -> None:
+    """Link the versioned stylesheet/script into the page; a no-op for the browser once linked."""
+    _loader(
+        styles=[versioned(name) for name in STYLESHEETS],
+        scripts=[versioned(name) for name in SCRIPTS],
+        key="app_assets",
+        default=None,
+    )
@@ -0,0 +1,230 @@
+"""
+OpenAI Assistants v2 helpers for session-scoped conversations.
+A chat session creates its thread once and reuses it; each turn is sent as a
+single "create run" call that carries the user message in additional_messages.
+Turns can either be polled to completion or streamed as server-sent events.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+
+import openai_http
+from run_waiter import UNFINISHED_STATUSES, BackoffPolicy, describe_failure, wait_for_run
+
+# Run events that end a stream without an answer, mapped to the run status.
+_FAILED_RUN_EVENTS = {
+    "thread.run.failed": "failed",
+    "thread.run.cancelled": "cancelled",
+    "thread.run.expired": "expired",
+    "thread.run.incomplete": "incomplete",
+    "thread.run.requires_action": "requires_action",
+}
+# Run events after which the run is no longer active (requires_action still is).
+_FINAL_RUN_EVENTS = {"thread.run.completed"} | (set(_FAILED_RUN_EVENTS) - {"thread.run.requires_action"})
+
+
+class StreamUnavailable(RuntimeError):
+    """The event stream could not be opened; nothing was started server-side."""
+
+
+def _json_or_raise(resp: requests.Response, action: str) -> Dict[str, Any]:
+    if resp.status_code != 200:
+        raise RuntimeError(f"Error {action}: {resp.status_code} - {resp.text}")
+    return resp.json()
+
+
+def thread_payload(messages: Sequence[Tuple[str, str]] = ()) -> Dict[str, Any]:
+    """Create-thread body, seeded with earlier (role, content) turns the thread has not seen."""
+    return {"messages": [{"role": role, "content": content} for role, content in messages]}
+
+
+def create_thread(messages: Sequence[Tuple[str, str]] = ()) -> str:
+    resp = openai_http.post("/threads", json=thread_payload(messages))
+    return _json_or_raise(resp, "creating thread")["id"]
+
+
+def run_payload(assistant_id: str, content: str, context_messages: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Build a create-run body. context_messages (e.g. an attached document) are added to the
+    thread ahead of the question in the same call, and stay there for later turns.
+    """
+    messages: List[Dict[str, str]] = [{"role": "user", "content": m} for m in context_messages]
+    messages.append({"role": "user", "content": content})
+    return {"assistant_id": assistant_id, "additional_messages": messages}
+
+
+def create_run(
+    assistant_id: str,
+    thread_id: str,
+    content: str,
+    context_messages: Sequence[str] = (),
+) -> Dict[str, Any]:
+    payload = run_payload(assistant_id, content, context_messages)
+    resp = openai_http.post(f"/threads/{thread_id}/runs", json=payload)
+    return _json_or_raise(resp, "creating run")
+
+
+def get_run(thread_id: str, run_id: str) -> Dict[str, Any]:
+    resp = openai_http.get(f"/threads/{thread_id}/runs/{run_id}")
+    return _json_or_raise(resp, "checking run status")
+
+
+def cancel_run(thread_id: str, run_id: str) -> None:
+    """Best-effort cancel, so an abandoned run does not block the thread's next turn."""
+    try:
+        openai_http.post(f"/threads/{thread_id}/runs/{run_id}/cancel")
+    except requests.RequestException:
+        pass
+
+
+def get_run_reply(thread_id: str, run_id: str) -> Optional[str]:
+    """Return the text of the newest assistant message produced by a run."""
+    resp = openai_http.get(
+        f"/threads/{thread_id}/messages",
+        params={"run_id": run_id, "order": "desc", "limit": 10},
+    )
+    messages = _json_or_raise(resp, "retrieving messages")["data"]
+    for message in messages:
+        if message["role"] != "assistant":
+            continue
+        for content in message["content"]:
+            if content["type"] == "text":
+                return content["text"]["value"]
+    return None
+
+
+def run_turn(
+    assistant_id: str,
+    thread_id: str,
+    content: str,
+    context_messages: Sequence[str] = (),
+    policy: Optional[BackoffPolicy] = None,
+) -> str:
+    """
+    Send one user turn on an existing thread and wait for the assistant's answer.
+    Raises RuntimeError if the run does not complete with a text reply.
+    """
+    run_id = create_run(assistant_id, thread_id, content, context_messages)["id"]
+
+    result = wait_for_run(lambda: get_run(thread_id, run_id), policy)
+    if result.status in UNFINISHED_STATUSES:
+        cancel_run(thread_id, run_id)
+    if result.status != "completed":
+        raise RuntimeError(describe_failure(result))
+
+    reply = get_run_reply(thread_id, run_id)
+    if reply is None:
+        raise RuntimeError("No response from assistant")
+    return reply
+
+
+class SSEDecoder:
+    """Incremental text/event-stream decoder: feed it lines, get back complete (event, data) pairs."""
+
+    def __init__(self):
+        self._event, self._data = "", []
+
+    def feed(self, line: str) -> Optional[Tuple[str, str]]:
+        if not line:
+            event, data = self._event, self._data
+            self._event, self._data = "", []
+            return (event, "\n".join(data)) if data else None
+        if line.startswith("event:"):
+            self._event = line[6:].strip()
+        elif line.startswith("data:"):
+            self._data.append(line[5:].lstrip())
+        return None
+
+    def close(self) -> Optional[Tuple[str, str]]:
+        """The last event, if the stream ended without a trailing blank line."""
+        return self.feed("")
+
+
+class RunStream:
+    """
+    State of one streamed run. handle() maps each event to the answer text it carries and
+    raises if the run failed; .done is set once the stream has nothing more to say, and
+    .run_id stays active on the thread unless .finished.
+    """
+
+    def __init__(self):
+        self.run_id: Optional[str] = None
+        self.finished = False
+        self.done = False
+
+    @property
+    def unfinished_run(self) -> Optional[str]:
+        return None if self.finished else self.run_id
+
+    def handle(self, event: str, data: str) -> List[str]:
+        if event == "done" or data == "[DONE]":
+            self.finished = self.done = True
+            return []
+        if event == "thread.run.created":
+            self.run_id = json.loads(data).get("id")
+        elif event in _FINAL_RUN_EVENTS:
+            self.finished = True
+        if event == "thread.message.delta":
+            return [
+                part["text"]["value"]
+                for part in json.loads(data)["delta"].get("content", [])
+                if part.get("type") == "text" and part["text"].get("value")
+            ]
+        if event in _FAILED_RUN_EVENTS:
+            raise RuntimeError(f"Run failed with status: {_FAILED_RUN_EVENTS[event]}")
+        if event == "error":
+            raise RuntimeError(f"Stream error: {data}")
+        return []
+
+
+def _iter_sse(resp: requests.Response) -> Iterator[Tuple[str, str]]:
+    """Yield (event, data) pairs from a text/event-stream response."""
+    decoder = SSEDecoder()
+    for line in resp.iter_lines(decode_unicode=True):
+        item = decoder.feed(line)
+        if item:
+            yield item
+    item = decoder.close()
+    if item:
+        yield item
+
+
+def stream_payload(assistant_id: str, content: str, context_messages: Sequence[str] = ()) -> Dict[str, Any]:
+    payload = run_payload(assistant_id, content, context_messages)
+    payload["stream"] = True
+    return payload
+
+
+def stream_turn(
+    assistant_id: str,
+    thread_id: str,
+    content: str,
+    context_messages: Sequence[str] = (),
+) -> Iterator[str]:
+    """
+    Send one user turn with stream=true and yield answer text as it arrives.
+    Raises StreamUnavailable if the stream cannot be opened, so callers can fall back to polling.
+    """
+    payload = stream_payload(assistant_id, content, context_messages)
+    try:
+        resp = openai_http.post(f"/threads/{thread_id}/runs", json=payload, stream=True)
+    except requests.RequestException as e:
+        raise StreamUnavailable(f"Error opening stream: {e}") from e
+
+    stream = RunStream()
+    try:
+        with resp:
+            if resp.status_code != 200:
+                raise StreamUnavailable(f"Error opening stream: {resp.status_code} - {resp.text}")
+            resp.encoding = "utf-8"
+            for event, data in _iter_sse(resp):
+                yield from stream.handle(event, data)
+                if stream.done:
+                    return
+    finally:
+        # A stream that stopped early (requires_action, an error, or a consumer that stopped
+        # reading) leaves the run active on the shared thread
+        if stream.unfinished_run:
+            cancel_run(thread_id, stream.unfinished_run)
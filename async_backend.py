@@ -0,0 +1,193 @@
+"""
+Asyncio backend for OpenAI Assistants turns.
+Every session's thread/run/poll calls are multiplexed on one event loop that runs
+in a daemon thread over a shared httpx.AsyncClient, so waiting on a run does not
+need a thread of its own. Streamed turns are read on the loop too and handed to
+the script thread chunk by chunk. Streamlit code uses the blocking facade methods.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import queue
+import threading
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, Optional, Sequence, Tuple, TypeVar
+
+import httpx
+
+import openai_http
+from assistant_client import RunStream, SSEDecoder, StreamUnavailable, run_payload, stream_payload, thread_payload
+from run_waiter import UNFINISHED_STATUSES, BackoffPolicy, RunWaitResult, async_wait_for_run, describe_failure
+
+MAX_CONNECTIONS = int(os.getenv("OPENAI_ASYNC_MAX_CONNECTIONS", "100"))
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class AsyncAssistantBackend:
+    def __init__(self, max_connections: int = MAX_CONNECTIONS):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="openai-async", daemon=True)
+        self._thread.start()
+        self._client = self.call(self._make_client(max_connections))
+
+    async def _make_client(self, max_connections: int) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=openai_http.API_BASE,
+            headers=openai_http.api_headers(),
+            timeout=httpx.Timeout(openai_http.READ_TIMEOUT, connect=openai_http.CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def submit(self, coro: Awaitable[T]) -> "concurrent.futures.Future[T]":
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def call(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        return self.submit(coro).result(timeout)
+
+    async def _request(self, method: str, path: str, action: str, **kwargs: Any) -> Dict[str, Any]:
+        resp = await self._client.request(method, path, **kwargs)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Error {action}: {resp.status_code} - {resp.text}")
+        return resp.json()
+
+    async def create_thread(self, messages: Sequence[Tuple[str, str]] = ()) -> str:
+        return (await self._request("POST", "/threads", "creating thread", json=thread_payload(messages)))["id"]
+
+    async def run_turn(
+        self,
+        assistant_id: str,
+        thread_id: str,
+        content: str,
+        context_messages: Sequence[str] = (),
+        policy: Optional[BackoffPolicy] = None,
+    ) -> str:
+        payload = run_payload(assistant_id, content, context_messages)
+        run = await self._request("POST", f"/threads/{thread_id}/runs", "creating run", json=payload)
+        result = await self.wait_for_run(thread_id, run["id"], policy)
+        if result.status in UNFINISHED_STATUSES:
+            await self.cancel_run(thread_id, run["id"])
+        if result.status != "completed":
+            raise RuntimeError(describe_failure(result))
+
+        messages = await self._request(
+            "GET",
+            f"/threads/{thread_id}/messages",
+            "retrieving messages",
+            params={"run_id": run["id"], "order": "desc", "limit": 10},
+        )
+        for message in messages["data"]:
+            if message["role"] != "assistant":
+                continue
+            for part in message["content"]:
+                if part["type"] == "text":
+                    return part["text"]["value"]
+        raise RuntimeError("No response from assistant")
+
+    async def stream_turn(
+        self,
+        assistant_id: str,
+        thread_id: str,
+        content: str,
+        context_messages: Sequence[str] = (),
+    ) -> AsyncIterator[str]:
+        """
+        Async counterpart of assistant_client.stream_turn: yields answer text as it arrives and
+        raises StreamUnavailable if the stream cannot be opened.
+        """
+        payload = stream_payload(assistant_id, content, context_messages)
+        request = self._client.build_request("POST", f"/threads/{thread_id}/runs", json=payload)
+        try:
+            resp = await self._client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            raise StreamUnavailable(f"Error opening stream: {e}") from e
+
+        stream, decoder = RunStream(), SSEDecoder()
+        try:
+            if resp.status_code != 200:
+                await resp.aread()
+                raise StreamUnavailable(f"Error opening stream: {resp.status_code} - {resp.text}")
+            async for line in resp.aiter_lines():
+                item = decoder.feed(line.rstrip("\r\n"))
+                if item is None:
+                    continue
+                for text in stream.handle(*item):
+                    yield text
+                if stream.done:
+                    return
+            item = decoder.close()
+            if item is not None:
+                for text in stream.handle(*item):
+                    yield text
+        finally:
+            await resp.aclose()
+            # Stopped early (requires_action, an error, or the reader went away): free the thread
+            if stream.unfinished_run:
+                await self.cancel_run(thread_id, stream.unfinished_run)
+
+    async def cancel_run(self, thread_id: str, run_id: str) -> None:
+        """Best-effort cancel, so an abandoned run does not block the thread's next turn."""
+        try:
+            await self._client.post(f"/threads/{thread_id}/runs/{run_id}/cancel")
+        except httpx.HTTPError:
+            pass
+
+    async def wait_for_run(self, thread_id: str, run_id: str, policy: Optional[BackoffPolicy] = None) -> RunWaitResult:
+        return await async_wait_for_run(
+            lambda: self._request("GET", f"/threads/{thread_id}/runs/{run_id}", "checking run status"),
+            policy,
+        )
+
+    # Blocking facade for Streamlit script threads
+    def create_thread_blocking(self, messages: Sequence[Tuple[str, str]] = ()) -> str:
+        return self.call(self.create_thread(messages))
+
+    def run_turn_blocking(
+        self,
+        assistant_id: str,
+        thread_id: str,
+        content: str,
+        context_messages: Sequence[str] = (),
+    ) -> str:
+        return self.call(self.run_turn(assistant_id, thread_id, content, context_messages))
+
+    def stream_turn_blocking(
+        self,
+        assistant_id: str,
+        thread_id: str,
+        content: str,
+        context_messages: Sequence[str] = (),
+    ) -> Iterator[str]:
+        """Yield stream_turn's chunks on the calling thread; closing the generator cancels the run."""
+        chunks: "queue.Queue[Any]" = queue.Queue()
+
+        async def pump() -> None:
+            async for text in self.stream_turn(assistant_id, thread_id, content, context_messages):
+                chunks.put(text)
+
+        future = self.submit(pump())
+        future.add_done_callback(lambda _: chunks.put(_DONE))
+        try:
+            while True:
+                item = chunks.get()
+                if item is _DONE:
+                    future.result()  # re-raises StreamUnavailable or a failed run
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+
+_backend: Optional[AsyncAssistantBackend] = None
+_lock = threading.Lock()
+
+
+def get_backend() -> AsyncAssistantBackend:
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = AsyncAssistantBackend()
+    return _backend
@@ -0,0 +1,155 @@
+"""
+Voice clip preprocessing before transcription.
+Recordings from audio_recorder are decoded with NumPy, mixed down to mono,
+trimmed of leading/trailing silence by frame energy (the recorder keeps
+pause_threshold seconds of silence at the end), resampled to the transcription
+rate and re-encoded compactly as FLAC (soundfile), falling back to 16-bit PCM
+WAV if soundfile cannot be loaded or AUDIO_FORMAT=wav. Byte counts and step
+timings are logged.
+"""
+
+import io
+import logging
+import os
+import time
+import wave
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import soundfile
+except (ImportError, OSError):  # missing package or libsndfile: WAV output
+    soundfile = None
+
+logger = logging.getLogger(__name__)
+
+AUDIO_TARGET_RATE = int(os.getenv("AUDIO_TARGET_RATE", "16000"))
+# A frame counts as speech when it is this many dB above the clip's noise floor
+AUDIO_VAD_MARGIN_DB = float(os.getenv("AUDIO_VAD_MARGIN_DB", "12"))
+AUDIO_VAD_MIN_DBFS = float(os.getenv("AUDIO_VAD_MIN_DBFS", "-55"))
+AUDIO_VAD_PAD_MS = int(os.getenv("AUDIO_VAD_PAD_MS", "200"))
+AUDIO_FORMAT = os.getenv("AUDIO_FORMAT", "flac").lower()
+if AUDIO_FORMAT == "flac" and soundfile is None:
+    logger.warning("AUDIO_FORMAT=flac but soundfile could not be loaded; sending WAV")
+
+_FRAME_MS = 20
+
+
+@dataclass
+class PreparedAudio:
+    data: bytes
+    filename: str
+    mime: str
+    seconds: float
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """PCM WAV bytes -> (float32 samples in [-1, 1] shaped (frames, channels), sample rate)."""
+    with wave.open(io.BytesIO(data)) as w:
+        channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width} bytes")
+    return samples.reshape(-1, channels), rate
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def trim_silence(samples: np.ndarray, rate: int) -> np.ndarray:
+    """
+    Drop leading/trailing frames below the energy threshold. Empty only when every frame is
+    below AUDIO_VAD_MIN_DBFS; a clip with no clear speech/silence boundary (a noisy room, or
+    speech all the way through) is returned untrimmed rather than dropped.
+    """
+    frame = max(rate * _FRAME_MS // 1000, 1)
+    n = len(samples) // frame
+    if n == 0:
+        return samples
+    frames = samples[: n * frame].reshape(n, frame)
+    rms_db = 20 * np.log10(np.sqrt(np.mean(frames * frames, axis=1)) + 1e-9)
+    if not np.any(rms_db > AUDIO_VAD_MIN_DBFS):
+        return samples[:0]
+    floor = np.percentile(rms_db, 10)
+    voiced = np.flatnonzero(rms_db > max(floor + AUDIO_VAD_MARGIN_DB, AUDIO_VAD_MIN_DBFS))
+    if len(voiced) == 0:
+        return samples
+    pad = AUDIO_VAD_PAD_MS // _FRAME_MS
+    start = max(voiced[0] - pad, 0) * frame
+    end = min((voiced[-1] + 1 + pad) * frame, len(samples))
+    return samples[start:end]
+
+
+def resample(samples: np.ndarray, rate: int, target: int) -> np.ndarray:
+    """Linear-interpolation resampling; plenty for speech recognition input."""
+    if rate == target or len(samples) == 0:
+        return samples
+    duration = len(samples) / rate
+    positions = np.arange(int(duration * target)) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def encode(samples: np.ndarray, rate: int) -> Tuple[bytes, str, str]:
+    """Return (bytes, filename, mime type)."""
+    if AUDIO_FORMAT == "flac" and soundfile is not None:
+        buf = io.BytesIO()
+        soundfile.write(buf, samples, rate, format="FLAC", subtype="PCM_16")
+        return buf.getvalue(), "audio.flac", "audio/flac"
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue(), "audio.wav", "audio/wav"
+
+
+def prepare(data: bytes, target_rate: int = AUDIO_TARGET_RATE) -> Optional[PreparedAudio]:
+    """
+    Preprocess a WAV recording for upload. Returns None when the whole clip is below
+    AUDIO_VAD_MIN_DBFS (nothing was said).
+    Raises ValueError (or wave.Error) for input it cannot decode.
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    def step(name: str) -> None:
+        nonlocal start
+        now = time.perf_counter()
+        timings[name] = now - start
+        start = now
+
+    samples, rate = decode_wav(data)
+    step("decode")
+    samples = to_mono(samples)
+    step("mono")
+    before = len(samples) / rate
+    samples = trim_silence(samples, rate)
+    step("trim")
+    if len(samples) == 0:
+        logger.info("audio: silent %.2fs clip (%d bytes)", before, len(data))
+        return None
+    samples = resample(samples, rate, min(rate, target_rate))
+    rate = min(rate, target_rate)
+    step("resample")
+    encoded, filename, mime = encode(samples, rate)
+    step("encode")
+
+    seconds = len(samples) / rate
+    logger.info(
+        "audio: %d -> %d bytes, %.2fs -> %.2fs, %s (%s)",
+        len(data), len(encoded), before, seconds, filename,
+        ", ".join(f"{k} {v * 1000:.1f}ms" for k, v in timings.items()),
+    )
+    return PreparedAudio(data=encoded, filename=filename, mime=mime, seconds=seconds, timings=timings)
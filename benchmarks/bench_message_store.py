@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark memory held by idle chat sessions: plain lists of message dicts
+versus message_store.MessageStore (hot window in memory, the rest spilled).
+
+Usage:
+    python benchmarks/bench_message_store.py [--sessions 2000] [--turns 200] [--chars 600]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import message_store  # noqa: E402
+
+
+def make_text(rng: random.Random, chars: int) -> str:
+    words = ["tendon", "anchor", "CMI", "trumplate", "strand", "wedge", "duct", "grout", "kN", "mm"]
+    out, size = [], 0
+    while size < chars:
+        word = rng.choice(words)
+        out.append(word)
+        size += len(word) + 1
+    return " ".join(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--chars", type=int, default=600)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Distinct strings per turn, as with real answers (no sharing between sessions)
+    def turns():
+        for i in range(args.turns):
+            yield ("user" if i % 2 else "assistant"), make_text(rng, args.chars) + str(rng.random())
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    lists = []
+    for _ in range(args.sessions):
+        lists.append([{"role": role, "content": text} for role, text in turns()])
+    dict_bytes = tracemalloc.get_traced_memory()[0] - base
+    del lists
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spill = message_store.SQLiteSpill(Path(tmp) / "bench.sqlite")
+        base = tracemalloc.get_traced_memory()[0]
+        stores = []
+        for _ in range(args.sessions):
+            store = message_store.MessageStore(spill=spill)
+            for role, text in turns():
+                store.append(role, text)
+            stores.append(store)
+        store_bytes = tracemalloc.get_traced_memory()[0] - base
+        spilled = spill.rows
+        spill_mb = os.path.getsize(spill.path) / 1e6
+        spill.close()
+
+    print(f"{args.sessions} sessions x {args.turns} turns x ~{args.chars} chars")
+    print(f"list of dicts   {dict_bytes / 1e6:9.1f} MB")
+    print(
+        f"MessageStore    {store_bytes / 1e6:9.1f} MB   "
+        f"(hot {message_store.HOT_MESSAGES}/session, {spilled} spilled turns, {spill_mb:.1f} MB on disk)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark script execution time per UI interaction in the chat app.
+
+Starts the app with `streamlit run` and drives it over the websocket the way the
+browser does. For each interaction it reports the time spent executing the
+script (Streamlit's own per-run exec_time, summed over the runs one click
+causes), the round trip from the BackMsg to the final script_finished, and the
+bytes sent back. Run it against two checkouts to compare, e.g. before and after
+moving widgets into fragments:
+
+    git worktree add /tmp/before <rev>
+    python benchmarks/bench_reruns.py --app /tmp/before/app_streamlit_v2.py
+    python benchmarks/bench_reruns.py
+
+--messages sends that many chat messages first so full reruns have history to
+redraw; the app talks to whatever OPENAI_BASE_URL / ASSISTANT_ID are set
+(benchmarks/openai_stub.py serves canned answers locally).
+
+Usage:
+    python benchmarks/bench_reruns.py [--app app_streamlit_v2.py] [--repeat 20] [--messages 0]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from tornado.ioloop import IOLoop
+from tornado.websocket import websocket_connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Sample(NamedTuple):
+    total: float  # seconds from BackMsg to script_finished
+    script: float  # seconds spent executing the script / fragments (Streamlit's exec_time)
+    size: int  # bytes sent back
+    deltas: int
+
+
+_DONE = (
+    ForwardMsg.ScriptFinishedStatus.FINISHED_SUCCESSFULLY,
+    ForwardMsg.ScriptFinishedStatus.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+    ForwardMsg.ScriptFinishedStatus.FINISHED_WITH_COMPILE_ERROR,
+)
+
+
+def start_server(app: str, port: int, gc: bool, timeout: float = 60) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", os.path.basename(app),
+            "--server.headless", "true",
+            "--server.port", str(port),
+            # Only sent to this client: turns on the page_profile message carrying exec_time
+            "--browser.gatherUsageStats", "true",
+            # Streamlit runs a full gc after every run; it costs the same for fragment and
+            # full reruns and would otherwise dominate the timings
+            "--runner.postScriptGC", str(gc).lower(),
+        ],
+        cwd=os.path.dirname(os.path.abspath(app)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"streamlit did not start on port {port}")
+
+
+class Session:
+    """One browser tab: sends reruns and remembers widget ids, their element type and fragment."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets: Dict[str, Tuple[str, str]] = {}  # id -> (element type, fragment id)
+
+    def find(self, key: str = "", kind: str = "") -> Tuple[str, str]:
+        """(widget id, fragment id) of the widget with this user key or element type."""
+        for widget_id, (widget_kind, fragment_id) in self.widgets.items():
+            if (key and widget_id.endswith("-" + key)) or (kind and widget_kind == kind):
+                return widget_id, fragment_id
+        raise RuntimeError(f"widget not found: {key or kind}")
+
+    async def run(self, widget: Optional[Tuple[str, str]] = None, text: Optional[str] = None) -> Sample:
+        """Trigger a rerun (a button click, or a chat message if text is set) and wait for it."""
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.query_string = ""  # sets the oneof even when no widget is triggered
+        if widget is not None:
+            widget_id, state.fragment_id = widget
+            ws = state.widget_states.widgets.add()
+            ws.id = widget_id
+            if text is None:
+                ws.trigger_value = True
+            else:
+                ws.string_trigger_value.data = text
+        start = time.perf_counter()
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        size = deltas = exec_us = 0
+        while True:
+            raw = await self.ws.read_message()
+            if raw is None:
+                raise RuntimeError("websocket closed")
+            size += len(raw)
+            fm = ForwardMsg()
+            fm.ParseFromString(raw)
+            kind = fm.WhichOneof("type")
+            if kind == "delta":
+                deltas += 1
+                self._index(fm.delta)
+            elif kind == "page_profile":
+                # One per script or fragment run, including runs cut short by st.rerun()
+                exec_us += fm.page_profile.exec_time
+            elif kind == "script_finished" and fm.script_finished in _DONE:
+                return Sample(time.perf_counter() - start, exec_us / 1e6, size, deltas)
+
+    def _index(self, delta) -> None:
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        proto = getattr(element, kind) if kind else None
+        widget_id = getattr(proto, "id", "")
+        if widget_id.startswith("$$WIDGET_ID"):
+            self.widgets[widget_id] = (kind, delta.fragment_id)
+
+
+def summarize(name: str, samples: List[Sample]) -> None:
+    print(
+        f"{name:<22} script {statistics.median(s.script for s in samples) * 1000:7.1f} ms   "
+        f"round trip {statistics.median(s.total for s in samples) * 1000:7.1f} ms   "
+        f"{statistics.mean(s.size for s in samples) / 1024:7.1f} KB   "
+        f"{statistics.mean(s.deltas for s in samples):6.1f} deltas"
+    )
+
+
+async def bench(port: int, repeat: int, messages: int) -> None:
+    ws = await websocket_connect(f"ws://127.0.0.1:{port}/_stcore/stream", max_message_size=256 * 1024 * 1024)
+    session = Session(ws)
+    summarize("initial load", [await session.run()])
+
+    for i in range(messages):
+        await session.run(session.find(kind="chat_input"), text=f"Question {i}")
+    if messages:
+        summarize(f"full rerun ({messages} msgs)", [await session.run() for _ in range(repeat)])
+
+    results: Dict[str, List[Sample]] = {"open tools": [], "close tools": []}
+    for _ in range(repeat):
+        results["open tools"].append(await session.run(session.find("toggle_tools")))
+        results["close tools"].append(await session.run(session.find("toggle_tools")))
+    for name, samples in results.items():
+        summarize(name, samples)
+    ws.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", default=os.path.join(ROOT, "app_streamlit_v2.py"))
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=0)
+    parser.add_argument("--post-script-gc", action="store_true", help="keep Streamlit's gc.collect() after each run")
+    args = parser.parse_args()
+
+    proc = start_server(args.app, args.port, args.post_script_gc)
+    try:
+        print(f"{args.app}: {args.repeat} runs per interaction")
+        IOLoop.current().run_sync(lambda: bench(args.port, args.repeat, args.messages))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
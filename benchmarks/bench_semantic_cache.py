@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark semantic_cache lookups against a large cache.
+
+Usage:
+    python benchmarks/bench_semantic_cache.py [--entries 100000] [--queries 500]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import HashedNgramEmbedder, SemanticCache  # noqa: E402
+
+PRODUCTS = ["CMI", "CMG", "CMM", "CMF", "CMB", "CONA", "HiAm", "DINA", "BBR VT"]
+TEMPLATES = [
+    "What's the spec for {p} {n}?",
+    "Weight of {p} trumplate {n}?",
+    "How heavy is the {n} {p} anchor head",
+    "Installation steps for {p} {n} tendon",
+    "Minimum edge distance for {p} {n}",
+]
+
+
+def make_prompt(rng: random.Random) -> str:
+    return rng.choice(TEMPLATES).format(p=rng.choice(PRODUCTS), n=rng.randint(100, 9999))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    embedder = HashedNgramEmbedder()
+    cache = SemanticCache(embedder=embedder, capacity=args.entries)
+
+    start = time.perf_counter()
+    prompts = [make_prompt(rng) for _ in range(args.entries)]
+    for i, prompt in enumerate(prompts):
+        cache.add(prompt, f"answer {i}")
+    fill = time.perf_counter() - start
+
+    queries = [rng.choice(prompts).lower() for _ in range(args.queries // 2)]
+    queries += [make_prompt(rng) for _ in range(args.queries - len(queries))]
+
+    timings = []
+    hits = 0
+    for query in queries:
+        t = time.perf_counter()
+        hits += cache.lookup(query) is not None
+        timings.append((time.perf_counter() - t) * 1000)
+
+    timings_arr = np.array(timings)
+    print(f"entries={len(cache)} dim={cache.dim} matrix={cache._vectors.nbytes / 1e6:.1f} MB fill={fill:.1f}s")
+    print(
+        f"lookup ms: p50={np.percentile(timings_arr, 50):.2f} "
+        f"p95={np.percentile(timings_arr, 95):.2f} max={timings_arr.max():.2f} "
+        f"hit rate={hits / len(queries):.0%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
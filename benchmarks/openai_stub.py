@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI endpoints this app calls, for benchmarks and manual tests.
+
+Serves threads, runs (polled or streamed as server-sent events), run cancel,
+messages, embeddings, audio transcriptions, file uploads and vector stores from memory,
+with canned answers. Vector stores stay "in_progress" for --index-seconds so
+the background upload path and its "indexing" badge can be exercised. Point the
+app at it with OPENAI_BASE_URL:
+
+    python benchmarks/openai_stub.py --port 8765 &
+    OPENAI_API_KEY=sk-test OPENAI_BASE_URL=http://127.0.0.1:8765/v1 \
+        FILE_CONTEXT_MODE=vector_store streamlit run app_streamlit_v2.py
+
+GET /v1/_log returns every request seen so far as [method, path] pairs.
+
+Usage:
+    python benchmarks/openai_stub.py [--port 8765] [--index-seconds 5] [--answer "..."]
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:12]}"
+
+
+class State:
+    def __init__(self, answer: str, index_seconds: float):
+        self.answer = answer
+        self.index_seconds = index_seconds
+        self.lock = threading.Lock()
+        self.log: List[Tuple[str, str]] = []
+        self.runs: Dict[str, Dict[str, Any]] = {}
+        self.stores: Dict[str, float] = {}  # vector store id -> time it finishes indexing
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: State
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send_json(self, obj: Any, status: int = 200) -> None:
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.headers.get("Content-Type", "").startswith("application/json"):
+            return {}  # multipart uploads: the content is not needed
+        return json.loads(raw or b"{}")
+
+    def _parts(self) -> List[str]:
+        path = self.path.split("?", 1)[0]
+        with self.state.lock:
+            self.state.log.append((self.command, path))
+        return path.strip("/").split("/")[1:]  # drop the "v1" prefix
+
+    def do_GET(self) -> None:
+        parts = self._parts()
+        state = self.state
+        if parts == ["_log"]:
+            with state.lock:
+                return self._send_json(state.log)
+        if len(parts) == 4 and parts[0] == "threads" and parts[2] == "runs":
+            run = state.runs.get(parts[3])
+            if run is None:
+                return self._send_json({"error": {"message": "No such run"}}, 404)
+            # Every run completes on its second status check
+            run["checks"] += 1
+            if run["status"] == "queued" and run["checks"] > 1:
+                run["status"] = "completed"
+            return self._send_json({"id": parts[3], "status": run["status"]})
+        if len(parts) == 3 and parts[0] == "threads" and parts[2] == "messages":
+            text = {"type": "text", "text": {"value": state.answer, "annotations": []}}
+            return self._send_json({"data": [{"role": "assistant", "content": [text]}]})
+        if len(parts) == 2 and parts[0] == "vector_stores":
+            ready_at = state.stores.get(parts[1])
+            if ready_at is None:
+                return self._send_json({"error": {"message": "No such vector store"}}, 404)
+            status = "completed" if time.time() >= ready_at else "in_progress"
+            counts = {"completed": int(status == "completed"), "failed": 0}
+            return self._send_json({"id": parts[1], "status": status, "file_counts": counts})
+        self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def do_POST(self) -> None:
+        parts = self._parts()
+        body = self._read_json()
+        state = self.state
+        if parts == ["threads"]:
+            return self._send_json({"id": _new_id("thread")})
+        if len(parts) == 2 and parts[0] == "threads":
+            return self._send_json({"id": parts[1], "tool_resources": body.get("tool_resources", {})})
+        if len(parts) == 3 and parts[0] == "threads" and parts[2] == "runs":
+            run_id = _new_id("run")
+            state.runs[run_id] = {"status": "queued", "checks": 0}
+            if body.get("stream"):
+                return self._stream(run_id)
+            return self._send_json({"id": run_id, "status": "queued"})
+        if len(parts) == 5 and parts[2] == "runs" and parts[4] == "cancel":
+            run = state.runs.get(parts[3])
+            if run is not None and run["status"] not in ("completed", "cancelled"):
+                run["status"] = "cancelled"
+            return self._send_json({"id": parts[3], "status": "cancelling"})
+        if parts == ["embeddings"]:
+            # Deterministic bag-of-words vectors: same words, same embedding
+            vec = [0.0] * int(body.get("dimensions") or 1536)
+            for word in str(body.get("input", "")).lower().split():
+                vec[zlib.crc32(word.encode()) % len(vec)] += 1.0
+            return self._send_json({"data": [{"index": 0, "embedding": vec}], "model": body.get("model")})
+        if parts == ["audio", "transcriptions"]:
+            return self._send_json({"text": "What is the weight of the CMI 1206 trumplate?"})
+        if parts == ["files"]:
+            return self._send_json({"id": _new_id("file"), "purpose": "assistants"})
+        if parts == ["vector_stores"]:
+            store_id = _new_id("vs")
+            state.stores[store_id] = time.time() + state.index_seconds
+            return self._send_json({"id": store_id, "status": "in_progress"})
+        self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def _stream(self, run_id: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(event: str, data: str) -> None:
+            chunk = f"event: {event}\ndata: {data}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+
+        send("thread.run.created", json.dumps({"id": run_id, "status": "queued"}))
+        for word in self.state.answer.split(" "):
+            delta = {"delta": {"content": [{"index": 0, "type": "text", "text": {"value": word + " "}}]}}
+            send("thread.message.delta", json.dumps(delta))
+        self.state.runs[run_id]["status"] = "completed"
+        send("thread.run.completed", json.dumps({"id": run_id, "status": "completed"}))
+        send("done", "[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--index-seconds", type=float, default=5.0, help="time a vector store stays in_progress")
+    parser.add_argument("--answer", default="The CMI 1206 trumplate weighs 38 kg.")
+    args = parser.parse_args()
+
+    Handler.state = State(args.answer, args.index_seconds)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    print(f"OpenAI stand-in on http://127.0.0.1:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
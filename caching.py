@@ -0,0 +1,138 @@
+"""
+In-process caches shared by every Streamlit session in the worker.
+ByteLRUCache is a thread-safe LRU bounded by approximate byte size (and
+optionally entry count), with an optional TTL and hit/miss counters.
+"""
+
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+def approx_size(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class ByteLRUCache(Generic[V]):
+    def __init__(
+        self,
+        max_bytes: int,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[Any], int] = approx_size,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Tuple[V, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes or (self.max_entries and len(self._data) > self.max_entries):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._drop(key)
+            return entry[0]
+
+    def _drop(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# -------- Answer cache --------
+ANSWER_CACHE_MB = float(os.getenv("ANSWER_CACHE_MB", "16"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))
+ANSWER_CACHE_ENTRIES = int(os.getenv("ANSWER_CACHE_ENTRIES", "5000"))
+
+_PUNCT_EDGES = " \t\n\"'“”‘’?!.。"
+
+
+def normalize_prompt(prompt: str) -> str:
+    text = re.sub(r"\s+", " ", prompt.replace("’", "'")).strip().lower()
+    return text.strip(_PUNCT_EDGES)
+
+
+def answer_key(prompt: str, assistant_id: str, context_hash: str = "") -> str:
+    raw = "\x1f".join((assistant_id, context_hash, normalize_prompt(prompt)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+_answer_cache: Optional[ByteLRUCache[str]] = None
+_answer_lock = threading.Lock()
+
+
+def get_answer_cache() -> ByteLRUCache[str]:
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_lock:
+            if _answer_cache is None:
+                _answer_cache = ByteLRUCache(
+                    max_bytes=int(ANSWER_CACHE_MB * 1024 * 1024),
+                    max_entries=ANSWER_CACHE_ENTRIES,
+                    ttl=ANSWER_CACHE_TTL,
+                )
+    return _answer_cache
@@ -27,9 +27,13 @@ create table if not exists public.sessions (
   user_id uuid references public.users(id),
   started_at timestamptz default now(),
   last_active_at timestamptz,
-  client_info text
+  client_info text,
+  thread_id text
 );
 
+-- OpenAI Assistants thread reused for every turn of the session
+alter table public.sessions add column if not exists thread_id text;
+
 -- Messages
 create table if not exists public.messages (
   id uuid primary key,
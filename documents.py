@@ -0,0 +1,513 @@
+"""
+Text extraction for uploaded documents (pdf, docx, txt).
+Text is produced incrementally (page by page, paragraph by paragraph) and
+extraction stops once the character budget is reached, so only the part of a
+long manual that can actually be used is parsed. Results are keyed by the
+SHA-256 of the file bytes: a bounded in-memory LRU in front of an on-disk text
+store shared by every process, so a data sheet is parsed once no matter how
+many reruns, sessions or workers upload it, and sessions only keep the hash.
+
+Parsing is CPU-bound pure Python, so the app runs it in a bounded process pool
+(submit_extraction) with progress reporting and cooperative cancellation checked
+between pages; the web process keeps serving other sessions meanwhile. The
+per-job timeout is enforced by an alarm in the worker, so it also interrupts a
+parse stuck inside one page, and a worker that still does not stop is killed
+and the pool replaced. Uploads are spooled to a temp file and workers parse them
+through a memory map instead of receiving the bytes, and each worker runs under
+an address-space limit and is recycled after a number of jobs.
+"""
+
+import codecs
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Tuple, Union
+
+from docx import Document
+from pypdf import PdfReader
+
+from caching import ByteLRUCache, approx_size
+
+EXTRACT_CACHE_MB = float(os.getenv("EXTRACT_CACHE_MB", "64"))
+MAX_CONTEXT_CHARS = int(os.getenv("MAX_CONTEXT_CHARS", "12000"))
+# Upper bound on text extracted for retrieval indexing (see retrieval.py)
+MAX_INDEX_CHARS = int(os.getenv("MAX_INDEX_CHARS", "1000000"))
+# Upper bound on text attached once to a conversation thread (FILE_CONTEXT_MODE=attach)
+MAX_ATTACH_CHARS = int(os.getenv("MAX_ATTACH_CHARS", "200000"))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "60"))
+# Seconds past EXTRACT_TIMEOUT before a worker that ignored its alarm (stuck in C code) is killed
+EXTRACT_KILL_GRACE = float(os.getenv("EXTRACT_KILL_GRACE", "10"))
+# Address-space limit per parsing worker (0 disables) and jobs before a worker is recycled
+EXTRACT_WORKER_MEMORY_MB = int(os.getenv("EXTRACT_WORKER_MEMORY_MB", "1024"))
+EXTRACT_WORKER_MAX_TASKS = int(os.getenv("EXTRACT_WORKER_MAX_TASKS", "50"))
+UPLOAD_SPOOL_DIR = Path(os.getenv("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "bbr_uploads")))
+TEXT_STORE_DIR = Path(os.getenv("TEXT_STORE_DIR", ".cache/texts"))
+TEXT_STORE_MB = float(os.getenv("TEXT_STORE_MB", "1024"))
+
+Source = Union[bytes, BinaryIO]
+
+# Called after each page with (pages scanned, total pages); return False to stop.
+ProgressCallback = Callable[[int, Optional[int]], bool]
+
+
+class ExtractionCancelled(Exception):
+    pass
+
+
+@dataclass
+class Extraction:
+    text: str
+    pages_scanned: int
+    total_pages: Optional[int]
+    truncated: bool
+    seconds: float
+
+
+def _kind(name: str) -> str:
+    name = name.lower()
+    if name.endswith(".pdf"):
+        return "pdf"
+    if name.endswith(".docx"):
+        return "docx"
+    return "text"
+
+
+def _read_text(stream: Any, budget: int) -> str:
+    """Decode at most ~budget characters from the start of a plain-text file."""
+    raw = stream.read(budget * 4 + 4)
+    try:
+        return codecs.getincrementaldecoder("utf-8")().decode(raw, final=False)
+    except UnicodeDecodeError:
+        return raw.decode("latin-1", errors="ignore")
+
+
+def iter_text(name: str, source: Source, budget: int = MAX_CONTEXT_CHARS) -> Tuple[Optional[int], Iterator[str]]:
+    """
+    Return (total units, iterator of text per unit) where a unit is a PDF page,
+    a DOCX paragraph, or the whole of a plain-text file. Parsing happens lazily.
+    source is the file bytes or a seekable binary stream (e.g. a memory map).
+    """
+    stream = io.BytesIO(source) if isinstance(source, bytes) else source
+    kind = _kind(name)
+    if kind == "pdf":
+        reader = PdfReader(stream)
+        return len(reader.pages), ((page.extract_text() or "") for page in reader.pages)
+    if kind == "docx":
+        doc = Document(stream)
+        paragraphs = doc.paragraphs
+        return len(paragraphs), (p.text for p in paragraphs)
+    return 1, iter([_read_text(stream, budget)])
+
+
+def extract_text(
+    name: str,
+    source: Source,
+    budget: int = MAX_CONTEXT_CHARS,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Extraction:
+    """Parse a document until `budget` characters are collected; raises on unreadable files."""
+    start = time.perf_counter()
+    total, units = iter_text(name, source, budget)
+    parts = []
+    collected = 0
+    scanned = 0
+    for part in units:
+        scanned += 1
+        parts.append(part)
+        collected += len(part) + 1
+        if collected >= budget:
+            break
+        if on_progress is not None and not on_progress(scanned, total):
+            raise ExtractionCancelled(f"Extraction of {name} stopped after {scanned} pages")
+    text = "\n".join(parts)
+    truncated = len(text) > budget or (total is not None and scanned < total)
+    return Extraction(
+        text=text[:budget],
+        pages_scanned=scanned,
+        total_pages=total,
+        truncated=truncated,
+        seconds=time.perf_counter() - start,
+    )
+
+
+class _MappedFile(io.RawIOBase):
+    """Read-only file object over an mmap (zipfile/pypdf need seekable(), which mmap lacks)."""
+
+    def __init__(self, mm: mmap.mmap):
+        self._mm = mm
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._mm.read(size)
+
+    def readinto(self, buffer: Any) -> int:
+        data = self._mm.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._mm.seek(offset, whence)
+        return self._mm.tell()
+
+    def tell(self) -> int:
+        return self._mm.tell()
+
+
+def extract_file(
+    name: str,
+    path: Union[str, Path],
+    budget: int = MAX_CONTEXT_CHARS,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Extraction:
+    """extract_text over a memory map of a file on disk; pages are faulted in as parsed."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return extract_text(name, b"", budget, on_progress)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return extract_text(name, _MappedFile(mm), budget, on_progress)
+
+
+def spool_upload(fileobj: BinaryIO, chunk_size: int = 1 << 20) -> Path:
+    """Copy an upload in chunks to a temp file under UPLOAD_SPOOL_DIR for a worker to map."""
+    UPLOAD_SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_SPOOL_DIR, prefix="upload-", delete=False) as tmp:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            tmp.write(chunk)
+    return Path(tmp.name)
+
+
+def _remove_quietly(path: Union[str, Path]) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class TextStore:
+    """
+    Extractions on disk, one JSON file per (sha256, kind, budget), shared by every
+    process. The oldest files are pruned once the store exceeds max_bytes.
+    """
+
+    def __init__(self, root: Path = TEXT_STORE_DIR, max_bytes: int = int(TEXT_STORE_MB * 1024 * 1024)):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: Tuple[str, str, int]) -> Path:
+        digest, kind, budget = key
+        return self.root / f"{digest}-{kind}-{budget}.json"
+
+    def get(self, key: Tuple[str, str, int]) -> Optional[Extraction]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return Extraction(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def put(self, key: Tuple[str, str, int], extraction: Extraction) -> None:
+        path = self._path(key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.root, suffix=".tmp", delete=False) as tmp:
+            json.dump(asdict(extraction), tmp)
+        os.replace(tmp.name, path)
+        self._prune()
+
+    def _prune(self) -> None:
+        with self._lock:
+            try:
+                files = [(p.stat(), p) for p in self.root.glob("*.json")]
+            except OSError:
+                return
+            total = sum(st.st_size for st, _ in files)
+            for st, p in sorted(files, key=lambda item: item[0].st_mtime):
+                if total <= self.max_bytes:
+                    break
+                _remove_quietly(p)
+                total -= st.st_size
+
+
+_text_store: Optional[TextStore] = None
+_extract_cache: Optional[ByteLRUCache[Extraction]] = None
+_extract_lock = threading.Lock()
+
+
+def get_extract_cache() -> ByteLRUCache[Extraction]:
+    global _extract_cache
+    if _extract_cache is None:
+        with _extract_lock:
+            if _extract_cache is None:
+                _extract_cache = ByteLRUCache(
+                    max_bytes=int(EXTRACT_CACHE_MB * 1024 * 1024),
+                    sizeof=lambda extraction: approx_size(extraction.text),
+                )
+    return _extract_cache
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_text_store() -> TextStore:
+    global _text_store
+    if _text_store is None:
+        with _extract_lock:
+            if _text_store is None:
+                _text_store = TextStore()
+    return _text_store
+
+
+def cached_extraction(name: str, digest: str, budget: int = MAX_CONTEXT_CHARS) -> Optional[Extraction]:
+    """Look up the in-memory LRU, then the shared on-disk store (promoting hits)."""
+    key = (digest, _kind(name), budget)
+    extraction = get_extract_cache().get(key)
+    if extraction is None:
+        extraction = get_text_store().get(key)
+        if extraction is not None:
+            get_extract_cache().put(key, extraction)
+    return extraction
+
+
+def store_extraction(name: str, digest: str, budget: int, extraction: Extraction) -> None:
+    key = (digest, _kind(name), budget)
+    get_extract_cache().put(key, extraction)
+    try:
+        get_text_store().put(key, extraction)
+    except OSError:
+        pass
+
+
+def cached_extract_text(name: str, data: bytes, budget: int = MAX_CONTEXT_CHARS) -> Tuple[str, Extraction]:
+    """Return (sha256, extraction), parsing in-process only on a cache miss."""
+    digest = content_hash(data)
+    extraction = cached_extraction(name, digest, budget)
+    if extraction is None:
+        extraction = extract_text(name, data, budget)
+        store_extraction(name, digest, budget, extraction)
+    return digest, extraction
+
+
+# -------- Process pool --------
+def _limit_worker_memory(limit_mb: int) -> None:
+    """Pool initializer: cap the worker's address space so one huge file cannot exhaust the host."""
+    if limit_mb <= 0:
+        return
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    limit = limit_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _run_with_alarm(seconds: float, message: str, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run fn in a worker process, raising TimeoutError once `seconds` have passed even if fn
+    never returns to Python code that checks a deadline (e.g. PdfReader on a hostile file).
+    """
+    if not hasattr(signal, "setitimer"):  # Windows: the parent's kill is the only backstop
+        return fn(*args)
+
+    def on_alarm(signum: int, frame: Any) -> None:
+        raise TimeoutError(message)
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, max(seconds, 0.01))
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_in_worker(job_id: str, name: str, path: str, budget: int, shared: Any, deadline: float) -> Extraction:
+    # Lets the parent kill this worker if it outlives the alarm
+    shared[f"{job_id}:pid"] = os.getpid()
+    message = f"Extraction of {name} exceeded {EXTRACT_TIMEOUT:.0f}s"
+    last_report = [0.0]
+
+    def on_progress(scanned: int, total: Optional[int]) -> bool:
+        now = time.time()
+        if now > deadline:
+            raise TimeoutError(message)
+        # Progress/cancel checks are IPC round trips; a few per second is plenty
+        if now - last_report[0] < 0.1:
+            return True
+        last_report[0] = now
+        shared[job_id] = (scanned, total)
+        return not shared.get(f"{job_id}:cancel")
+
+    try:
+        return _run_with_alarm(deadline - time.time(), message, extract_file, name, path, budget, on_progress)
+    except MemoryError:
+        raise RuntimeError(f"{name} needs more than {EXTRACT_WORKER_MEMORY_MB} MB to parse") from None
+
+
+class ExtractionJob:
+    def __init__(
+        self,
+        job_id: str,
+        name: str,
+        digest: str,
+        budget: int,
+        future: "Future[Extraction]",
+        shared: Any,
+        path: Optional[Path] = None,
+        pool: Optional[ProcessPoolExecutor] = None,
+    ):
+        self.job_id = job_id
+        self.name = name
+        self.digest = digest
+        self.budget = budget
+        self.future = future
+        self.path = path
+        self._shared = shared
+        self.pool = pool
+        self.started = time.monotonic()
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future: "Future[Extraction]") -> None:
+        if not future.cancelled() and future.exception() is None:
+            store_extraction(self.name, self.digest, self.budget, future.result())
+        if self.path is not None:
+            _remove_quietly(self.path)
+        with _pool_lock:
+            _running.pop(self.job_id, None)
+        for key in (self.job_id, f"{self.job_id}:cancel", f"{self.job_id}:pid"):
+            try:
+                self._shared.pop(key, None)
+            except Exception:
+                pass
+
+    def progress(self) -> Tuple[int, Optional[int]]:
+        try:
+            return self._shared.get(self.job_id, (0, None))
+        except Exception:
+            return 0, None
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def timed_out(self) -> bool:
+        return time.monotonic() - self.started > EXTRACT_TIMEOUT
+
+    def cancel(self) -> None:
+        """Drop a queued job, or ask a running one to stop at its next page."""
+        if not self.future.cancel():
+            try:
+                self._shared[f"{self.job_id}:cancel"] = True
+            except Exception:
+                pass
+
+    def result(self, timeout: Optional[float] = None) -> Extraction:
+        return self.future.result(timeout)
+
+    def worker_pid(self) -> Optional[int]:
+        try:
+            return self._shared.get(f"{self.job_id}:pid")
+        except Exception:
+            return None
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_shared: Any = None
+_pool_lock = threading.Lock()
+# Jobs submitted and not yet done, watched for workers that outlive their alarm
+_running: Dict[str, ExtractionJob] = {}
+_watchdog: Optional[threading.Thread] = None
+
+
+def _kill_stuck_workers() -> None:
+    """
+    Kill the worker of any job still running EXTRACT_KILL_GRACE seconds past its timeout and
+    retire its pool (a killed worker breaks it; the other jobs in it fail and can be retried),
+    so a stuck parse cannot hold a pool slot forever.
+    """
+    global _pool
+    limit = EXTRACT_TIMEOUT + EXTRACT_KILL_GRACE
+    with _pool_lock:
+        jobs = list(_running.values())
+    for job in jobs:
+        if job.done() or time.monotonic() - job.started < limit:
+            continue
+        pid = job.worker_pid()
+        if pid is None:
+            continue  # still queued: the caller cancels it
+        try:
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except OSError:
+            pass
+        with _pool_lock:
+            _running.pop(job.job_id, None)
+            if _pool is job.pool:
+                _pool = None
+        if job.pool is not None:
+            job.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _watch_workers() -> None:
+    while True:
+        time.sleep(1.0)
+        try:
+            _kill_stuck_workers()
+        except Exception:
+            pass
+
+
+def _get_pool() -> Tuple[ProcessPoolExecutor, Any]:
+    global _pool, _shared, _watchdog
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a multi-threaded web server is unsafe
+                ctx = multiprocessing.get_context("spawn")
+                if _shared is None:
+                    _shared = ctx.Manager().dict()
+                if _watchdog is None:
+                    _watchdog = threading.Thread(target=_watch_workers, name="extract-watchdog", daemon=True)
+                    _watchdog.start()
+                _pool = ProcessPoolExecutor(
+                    max_workers=EXTRACT_WORKERS,
+                    mp_context=ctx,
+                    initializer=_limit_worker_memory,
+                    initargs=(EXTRACT_WORKER_MEMORY_MB,),
+                    max_tasks_per_child=EXTRACT_WORKER_MAX_TASKS or None,
+                )
+    return _pool, _shared
+
+
+def submit_extraction(name: str, fileobj: BinaryIO, digest: str, budget: int = MAX_CONTEXT_CHARS) -> ExtractionJob:
+    """Spool the upload to disk and parse it in the pool; the spool file is removed when done."""
+    path = spool_upload(fileobj)
+    pool, shared = _get_pool()
+    job_id = uuid.uuid4().hex
+    future = pool.submit(_extract_in_worker, job_id, name, str(path), budget, shared, time.time() + EXTRACT_TIMEOUT)
+    job = ExtractionJob(job_id, name, digest, budget, future, shared, path, pool)
+    with _pool_lock:
+        if not job.done():
+            _running[job_id] = job
+    return job
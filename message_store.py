@@ -0,0 +1,220 @@
+"""
+Compact, bounded per-session chat history.
+Each session keeps its newest HOT_MESSAGES turns in memory as __slots__
+records with interned role strings; older turns are spilled to a SQLite file
+owned by this process and paged back in only while "Load earlier messages"
+has them on screen. Rows of expired sessions are dropped when their store is
+garbage-collected. memory_stats() is the per-process gauge, and is logged
+every MEMORY_LOG_INTERVAL seconds while sessions are spilling.
+"""
+
+import atexit
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Sequence
+
+from caching import approx_size
+
+logger = logging.getLogger(__name__)
+
+HOT_MESSAGES = int(os.getenv("HOT_MESSAGES", "30"))
+MESSAGE_SPILL_DIR = Path(os.getenv("MESSAGE_SPILL_DIR", ".cache"))
+MEMORY_LOG_INTERVAL = float(os.getenv("MEMORY_LOG_INTERVAL", "300"))
+
+
+class Message:
+    __slots__ = ("seq", "role", "content")
+
+    def __init__(self, seq: int, role: str, content: str):
+        self.seq = seq
+        self.role = sys.intern(role)
+        self.content = content
+
+    def size(self) -> int:
+        return sys.getsizeof(self) + approx_size(self.content)
+
+
+class SQLiteSpill:
+    """Older turns of every session in this process, keyed by store key and sequence number."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._dead: List[str] = []
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        # Scratch data: a crash loses nothing that outlives the process anyway
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " key TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL,"
+            " PRIMARY KEY (key, seq)) WITHOUT ROWID"
+        )
+        # Rows left by an earlier process with the same pid
+        self._conn.execute("DELETE FROM messages")
+
+    def put(self, key: str, messages: Sequence[Message]) -> None:
+        with self._lock:
+            self._purge()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (key, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(key, m.seq, m.role, m.content) for m in messages],
+            )
+            self.rows += len(messages)
+
+    def load(self, key: str, before: int, limit: int) -> List[Message]:
+        """Up to `limit` turns with seq < before, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, role, content FROM messages WHERE key = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (key, before, limit),
+            ).fetchall()
+        return [Message(seq, role, content) for seq, role, content in reversed(rows)]
+
+    def drop(self, key: str) -> None:
+        # Called from weakref finalizers, possibly in the middle of put(); deleted on the next put
+        self._dead.append(key)
+
+    def _purge(self) -> None:
+        while self._dead:
+            cur = self._conn.execute("DELETE FROM messages WHERE key = ?", (self._dead.pop(),))
+            self.rows -= max(cur.rowcount, 0)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+_spill: Optional[SQLiteSpill] = None
+_spill_lock = threading.Lock()
+
+
+def get_spill() -> SQLiteSpill:
+    global _spill
+    if _spill is None:
+        with _spill_lock:
+            if _spill is None:
+                _spill = SQLiteSpill(MESSAGE_SPILL_DIR / f"messages-{os.getpid()}.sqlite")
+                atexit.register(_spill.close)
+    return _spill
+
+
+_stores: "weakref.WeakSet[MessageStore]" = weakref.WeakSet()
+_last_log = 0.0
+
+
+class MessageStore:
+    """
+    One session's conversation. Only the hot window and any turns paged in for display
+    are held in memory; len() counts every turn, spilled or not.
+    """
+
+    def __init__(self, hot_size: int = HOT_MESSAGES, spill: Optional[SQLiteSpill] = None):
+        self.key = uuid.uuid4().hex
+        self.hot_size = max(hot_size, 1)
+        self._spill = spill or get_spill()
+        self._hot: Deque[Message] = deque()
+        # Spilled turns paged back in for "Load earlier messages", oldest first
+        self._paged: Deque[Message] = deque()
+        self._count = 0
+        self._bytes = 0
+        _stores.add(self)
+        weakref.finalize(self, self._spill.drop, self.key)
+
+    def append(self, role: str, content: str) -> Message:
+        message = Message(self._count, role, content)
+        self._count += 1
+        self._hot.append(message)
+        self._bytes += message.size()
+        if len(self._hot) > self.hot_size:
+            spilled = [self._hot.popleft() for _ in range(len(self._hot) - self.hot_size)]
+            self._spill.put(self.key, spilled)
+            if self._paged:
+                # Still on screen: keep the paged-in range contiguous with the hot window
+                self._paged.extend(spilled)
+            else:
+                self._bytes -= sum(m.size() for m in spilled)
+            _maybe_log_gauge()
+        return message
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Message]:
+        """Turns held in memory, oldest first."""
+        yield from self._paged
+        yield from self._hot
+
+    def hidden(self, limit: int) -> int:
+        """Turns older than the newest `limit`."""
+        return max(self._count - limit, 0)
+
+    def page_in(self, limit: int) -> None:
+        """Load spilled turns so the newest `limit` are all in memory."""
+        held = len(self._paged) + len(self._hot)
+        missing = min(limit, self._count) - held
+        if missing <= 0 or not held:
+            return
+        oldest = (self._paged or self._hot)[0]
+        older = self._spill.load(self.key, oldest.seq, missing)
+        self._paged.extendleft(reversed(older))
+        self._bytes += sum(m.size() for m in older)
+
+    def window(self, limit: int) -> List[Message]:
+        """The newest `limit` turns held in memory; paged-in turns beyond `limit` are released."""
+        keep = max(limit - len(self._hot), 0)
+        while len(self._paged) > keep:
+            self._bytes -= self._paged.popleft().size()
+        return list(self)[-limit:]
+
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+
+def memory_stats() -> Dict[str, int]:
+    """Per-process gauge: live sessions, turns and bytes held in memory, spilled turns, RSS."""
+    stores = list(_stores)
+    spill = _spill
+    return {
+        "sessions": len(stores),
+        "messages": sum(len(s._hot) + len(s._paged) for s in stores),
+        "bytes": sum(s.memory_bytes() for s in stores),
+        "spilled": spill.rows if spill else 0,
+        "rss_bytes": rss_bytes(),
+    }
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _maybe_log_gauge() -> None:
+    global _last_log
+    now = time.monotonic()
+    if now - _last_log < MEMORY_LOG_INTERVAL:
+        return
+    _last_log = now
+    stats = memory_stats()
+    logger.info(
+        "message store: %d sessions, %d messages (%.1f MB) in memory, %d spilled, rss %.0f MB",
+        stats["sessions"], stats["messages"], stats["bytes"] / 1e6, stats["spilled"], stats["rss_bytes"] / 1e6,
+    )
@@ -0,0 +1,63 @@
+"""
+Process-wide pooled HTTP client for the OpenAI REST API.
+A single keep-alive requests.Session (with shared default headers) is reused by
+every Streamlit session, so round trips skip the TCP+TLS handshake.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_BASE = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "20"))
+CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+
+Timeout = Union[float, Tuple[float, float]]
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"OpenAI-Beta": "assistants=v2"})
+                api_key = os.getenv("OPENAI_API_KEY")
+                if api_key:
+                    session.headers["Authorization"] = f"Bearer {api_key}"
+                _session = session
+    return _session
+
+
+def configure(api_key: str) -> None:
+    """Set the API key used for every request (apps may load it from config.py instead of env)."""
+    get_session().headers["Authorization"] = f"Bearer {api_key}"
+
+
+def api_headers() -> Dict[str, str]:
+    """Auth/beta headers for clients that do not go through the shared session."""
+    headers = get_session().headers
+    return {name: headers[name] for name in ("Authorization", "OpenAI-Beta") if name in headers}
+
+
+def request(method: str, path: str, timeout: Optional[Timeout] = None, **kwargs: Any) -> requests.Response:
+    url = path if path.startswith("http") else f"{API_BASE}{path}"
+    return get_session().request(method, url, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+
+
+def get(path: str, **kwargs: Any) -> requests.Response:
+    return request("GET", path, **kwargs)
+
+
+def post(path: str, **kwargs: Any) -> requests.Response:
+    return request("POST", path, **kwargs)
@@ -0,0 +1,122 @@
+"""
+Shared auto-intro opener.
+The opener answer is generated once per assistant id in a background thread
+(at startup) and served from memory to every new chat session. Once it is older
+than the TTL it keeps being served while a refresh runs in the background.
+A failed generation is retried with exponential backoff; until then new sessions
+start without an opener instead of each waiting on a fresh attempt.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import assistant_client
+
+logger = logging.getLogger(__name__)
+
+OPENER_PROMPT = "Please briefly introduce yourself and how you can help with BBR products and specs."
+OPENER_TTL = float(os.getenv("OPENER_TTL_SECONDS", str(6 * 3600)))
+OPENER_WAIT = float(os.getenv("OPENER_WAIT_SECONDS", "20"))
+OPENER_RETRY = float(os.getenv("OPENER_RETRY_SECONDS", "30"))
+OPENER_RETRY_MAX = float(os.getenv("OPENER_RETRY_MAX_SECONDS", "900"))
+
+
+def generate_opener(assistant_id: str) -> str:
+    """Ask the assistant for its introduction on a throwaway thread."""
+    thread_id = assistant_client.create_thread()
+    return assistant_client.run_turn(assistant_id, thread_id, OPENER_PROMPT)
+
+
+class OpenerCache:
+    def __init__(
+        self,
+        generate: Callable[[str], str] = generate_opener,
+        ttl: float = OPENER_TTL,
+        retry: float = OPENER_RETRY,
+        retry_max: float = OPENER_RETRY_MAX,
+    ):
+        self._generate = generate
+        self.ttl = ttl
+        self.retry = retry
+        self.retry_max = retry_max
+        self._texts: Dict[str, str] = {}
+        self._generated_at: Dict[str, float] = {}
+        # assistant id -> (consecutive failures, time of the last one)
+        self._failures: Dict[str, Tuple[int, float]] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def warm(self, assistant_id: str) -> Optional[threading.Event]:
+        """
+        Start a background (re)generation unless the opener is fresh, already being generated,
+        or its last attempt failed less than the backoff delay ago.
+        """
+        with self._lock:
+            if assistant_id in self._inflight:
+                return self._inflight[assistant_id]
+            now = time.monotonic()
+            generated_at = self._generated_at.get(assistant_id)
+            if generated_at is not None and now - generated_at < self.ttl:
+                return None
+            if now < self._retry_at(assistant_id):
+                return None
+            done = threading.Event()
+            self._inflight[assistant_id] = done
+        threading.Thread(target=self._refresh, args=(assistant_id, done), name="opener-refresh", daemon=True).start()
+        return done
+
+    def _refresh(self, assistant_id: str, done: threading.Event) -> None:
+        try:
+            text = self._generate(assistant_id)
+            with self._lock:
+                self._texts[assistant_id] = text
+                self._generated_at[assistant_id] = time.monotonic()
+                self._failures.pop(assistant_id, None)
+        except Exception as e:
+            with self._lock:
+                failures = self._failures.get(assistant_id, (0, 0.0))[0] + 1
+                self._failures[assistant_id] = (failures, time.monotonic())
+            logger.warning(
+                "opener generation failed for %s (%d in a row, retrying in %.0fs): %s",
+                assistant_id, failures, self._retry_at(assistant_id) - time.monotonic(), e,
+            )
+        finally:
+            with self._lock:
+                self._inflight.pop(assistant_id, None)
+            done.set()
+
+    def _retry_at(self, assistant_id: str) -> float:
+        """Monotonic time before which no new attempt is made (0 when the last one succeeded)."""
+        failures, failed_at = self._failures.get(assistant_id, (0, 0.0))
+        if not failures:
+            return 0.0
+        return failed_at + min(self.retry * 2 ** (failures - 1), self.retry_max)
+
+    def get(self, assistant_id: str, wait: float = OPENER_WAIT) -> Optional[str]:
+        """
+        Return the opener, refreshing it in the background when stale.
+        Only when no opener exists yet does this block (up to `wait` seconds) for a generation
+        it just started; while a failed one is backing off it returns None at once.
+        """
+        pending = self.warm(assistant_id)
+        text = self._texts.get(assistant_id)
+        if text is None and pending is not None:
+            pending.wait(wait)
+            text = self._texts.get(assistant_id)
+        return text
+
+
+_opener_cache: Optional[OpenerCache] = None
+_opener_lock = threading.Lock()
+
+
+def get_opener_cache() -> OpenerCache:
+    global _opener_cache
+    if _opener_cache is None:
+        with _opener_lock:
+            if _opener_cache is None:
+                _opener_cache = OpenerCache()
+    return _opener_cache
@@ -0,0 +1,130 @@
+"""
+In-process retrieval over uploaded documents.
+Extracted text is split into overlapping chunks and indexed with BM25; the
+per-term chunk weights are precomputed into a SciPy sparse matrix, so scoring a
+question is a column slice and a row sum. Only the top-k chunks relevant to each
+question are sent to the assistant instead of the whole document.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+from caching import ByteLRUCache
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1200"))
+RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "200"))
+# Documents at most this long are sent whole; retrieval only pays off for longer ones
+RETRIEVAL_MIN_CHARS = int(os.getenv("RETRIEVAL_MIN_CHARS", "4000"))
+RETRIEVAL_INDEX_CACHE_MB = float(os.getenv("RETRIEVAL_INDEX_CACHE_MB", "128"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text: str, size: int = RETRIEVAL_CHUNK_CHARS, overlap: int = RETRIEVAL_CHUNK_OVERLAP) -> List[str]:
+    """Split on paragraph boundaries into ~size-char chunks; overly long paragraphs are windowed."""
+    chunks: List[str] = []
+    current = ""
+    for para in re.split(r"\n\s*\n|\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        while len(para) > size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(para[:size])
+            para = para[size - overlap:]
+        if current and len(current) + len(para) + 1 > size:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else ""
+        current = f"{current}\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        vocab: Dict[str, int] = {}
+        rows, cols, vals = [], [], []
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for i, chunk in enumerate(chunks):
+            counts: Dict[int, int] = {}
+            tokens = tokenize(chunk)
+            lengths[i] = len(tokens)
+            for token in tokens:
+                col = vocab.setdefault(token, len(vocab))
+                counts[col] = counts.get(col, 0) + 1
+            rows.extend([i] * len(counts))
+            cols.extend(counts.keys())
+            vals.extend(counts.values())
+        self.vocab = vocab
+
+        tf = sparse.csr_matrix(
+            (np.asarray(vals, dtype=np.float32), (rows, cols)),
+            shape=(len(chunks), max(len(vocab), 1)),
+        )
+        n = max(len(chunks), 1)
+        df = np.bincount(tf.indices, minlength=tf.shape[1]).astype(np.float32)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avgdl = float(lengths.mean()) if len(chunks) else 1.0
+        norm = k1 * (1 - b + b * lengths / max(avgdl, 1.0))
+
+        # Precompute BM25 weight per (chunk, term) so a query only sums columns
+        weights = tf.copy()
+        row_norm = np.repeat(norm, np.diff(tf.indptr))
+        weights.data = idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + row_norm)
+        self.weights = weights.tocsc()
+
+    def nbytes(self) -> int:
+        w = self.weights
+        return w.data.nbytes + w.indices.nbytes + w.indptr.nbytes + sum(len(c) for c in self.chunks)
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> List[str]:
+        """Top-k chunks in document order; the opening chunks when no query term matches."""
+        cols = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+        if not cols or not self.chunks:
+            return self.chunks[:k]
+        scores = np.asarray(self.weights[:, cols].sum(axis=1)).ravel()
+        k = min(k, len(self.chunks))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = [i for i in top if scores[i] > 0] or list(range(k))
+        return [self.chunks[i] for i in sorted(top)]
+
+
+_index_cache: Optional[ByteLRUCache[BM25Index]] = None
+_index_lock = threading.Lock()
+
+
+def get_index(digest: str, text: str) -> BM25Index:
+    """Shared per-document index keyed by content hash; built on first use."""
+    global _index_cache
+    if _index_cache is None:
+        with _index_lock:
+            if _index_cache is None:
+                _index_cache = ByteLRUCache(
+                    max_bytes=int(RETRIEVAL_INDEX_CACHE_MB * 1024 * 1024),
+                    sizeof=lambda index: index.nbytes(),
+                )
+    index = _index_cache.get(digest)
+    if index is None:
+        index = BM25Index(chunk_text(text))
+        _index_cache.put(digest, index)
+    return index
+
+
+def relevant_context(digest: str, text: str, query: str, k: int = RETRIEVAL_TOP_K) -> List[str]:
+    if len(text) <= RETRIEVAL_MIN_CHARS:
+        return [text]
+    return get_index(digest, text).search(query, k)
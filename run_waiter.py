@@ -0,0 +1,129 @@
+"""
+Adaptive waiter for OpenAI Assistants runs.
+Polls quickly at first, then backs off exponentially with jitter up to a cap,
+until the run settles or the overall deadline passes.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# requires_action is not final for the API, but this app never submits tool outputs,
+# so waiting on it would only burn polls until the deadline.
+SETTLED_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete", "requires_action"}
+# Outcomes that leave the run active on the thread; it must be cancelled before the
+# thread accepts another run.
+UNFINISHED_STATUSES = {"timeout", "requires_action"}
+
+
+@dataclass
+class BackoffPolicy:
+    initial: float = 0.15
+    factor: float = 1.6
+    cap: float = 2.0
+    jitter: float = 0.25
+    deadline: float = 120.0
+
+    @classmethod
+    def from_env(cls) -> "BackoffPolicy":
+        return cls(
+            initial=float(os.getenv("OPENAI_POLL_INITIAL", cls.initial)),
+            cap=float(os.getenv("OPENAI_POLL_MAX", cls.cap)),
+            deadline=float(os.getenv("OPENAI_RUN_DEADLINE", cls.deadline)),
+        )
+
+    def delays(self) -> Iterator[float]:
+        delay = self.initial
+        while True:
+            yield delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            delay = min(delay * self.factor, self.cap)
+
+
+@dataclass
+class RunWaitResult:
+    status: str
+    run: Dict[str, Any]
+    polls: int
+    elapsed: float
+
+
+def wait_for_run(
+    fetch_run: Callable[[], Dict[str, Any]],
+    policy: Optional[BackoffPolicy] = None,
+) -> RunWaitResult:
+    """
+    Call fetch_run until the run settles. Returns status "timeout" once the deadline passes.
+    Errors raised by fetch_run propagate to the caller.
+    """
+    policy = policy or BackoffPolicy.from_env()
+    start = time.monotonic()
+    deadline = start + policy.deadline
+    polls = 0
+    run: Dict[str, Any] = {}
+    status = "timeout"
+
+    for delay in policy.delays():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            status = "timeout"
+            break
+        time.sleep(min(delay, remaining))
+        run = fetch_run()
+        polls += 1
+        status = run.get("status", "")
+        if status in SETTLED_STATUSES:
+            break
+
+    result = RunWaitResult(status=status, run=run, polls=polls, elapsed=time.monotonic() - start)
+    logger.info("run %s: %s after %d polls in %.2fs", run.get("id"), result.status, result.polls, result.elapsed)
+    return result
+
+
+async def async_wait_for_run(
+    fetch_run: Callable[[], Awaitable[Dict[str, Any]]],
+    policy: Optional[BackoffPolicy] = None,
+) -> RunWaitResult:
+    """Event-loop counterpart of wait_for_run; sleeping does not hold a thread."""
+    policy = policy or BackoffPolicy.from_env()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + policy.deadline
+    polls = 0
+    run: Dict[str, Any] = {}
+    status = "timeout"
+
+    for delay in policy.delays():
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            status = "timeout"
+            break
+        await asyncio.sleep(min(delay, remaining))
+        run = await fetch_run()
+        polls += 1
+        status = run.get("status", "")
+        if status in SETTLED_STATUSES:
+            break
+
+    result = RunWaitResult(status=status, run=run, polls=polls, elapsed=loop.time() - start)
+    logger.info("run %s: %s after %d polls in %.2fs", run.get("id"), result.status, result.polls, result.elapsed)
+    return result
+
+
+def describe_failure(result: RunWaitResult) -> str:
+    if result.status == "timeout":
+        return f"Timeout waiting for assistant response ({result.elapsed:.0f}s)"
+    if result.status == "incomplete":
+        reason = (result.run.get("incomplete_details") or {}).get("reason", "unknown reason")
+        return f"Assistant response incomplete: {reason}"
+    if result.status == "requires_action":
+        return "Assistant requested a tool call this app cannot handle"
+    error = (result.run.get("last_error") or {}).get("message")
+    if error:
+        return f"Run failed with status: {result.status} ({error})"
+    return f"Run failed with status: {result.status}"
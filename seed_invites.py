@@ -15,6 +15,7 @@ import os
 from dotenv import load_dotenv
 
 from supabase_client import (
+    check_health,
     get_client,
     get_user_by_email,
     create_user,
@@ -26,6 +27,8 @@ from supabase_client import (
 def main():
     load_dotenv()
     client = get_client()
+    if not check_health(client):
+        raise SystemExit("Supabase is not reachable; check SUPABASE_URL and your network.")
 
     targets = [
         ("adm_bbr", "admin"),
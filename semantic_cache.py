@@ -0,0 +1,320 @@
+"""
+Semantic near-duplicate answer cache.
+Prompts are embedded (offline by a hashed word + character n-gram vectorizer,
+or by the OpenAI embeddings endpoint with SEMANTIC_CACHE_EMBEDDER=openai) into
+rows of an L2-normalized NumPy matrix, so a lookup is a single matrix-vector
+product. The most similar cached prompt is
+reused when its cosine similarity clears the threshold and it mentions exactly
+the same key tokens: numbers and short product codes (CMI 1206 vs CMG 1506 must
+never be conflated, however similar the rest of the sentence is). Entries
+expire SEMANTIC_CACHE_TTL seconds after they were added, across restarts too.
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import openai_http
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "10000"))
+SEMANTIC_CACHE_DIR = Path(os.getenv("SEMANTIC_CACHE_DIR", ".cache/semantic"))
+SEMANTIC_CACHE_SAVE_EVERY = int(os.getenv("SEMANTIC_CACHE_SAVE_EVERY", "25"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(6 * 3600)))
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "hashed").lower()
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+SEMANTIC_CACHE_EMBEDDING_DIM = int(os.getenv("SEMANTIC_CACHE_EMBEDDING_DIM", "512"))
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], np.ndarray]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "any", "are", "at", "be", "by", "can", "do", "does", "for", "from", "give",
+    "how", "i", "in", "is", "it", "its", "me", "much", "my", "need", "of", "on", "or", "per", "s",
+    "show", "size", "spec", "tell", "that", "the", "this", "to", "use", "vs", "was", "what",
+    "whats", "with", "you", "your",
+}
+
+
+def _key_tokens(text: str) -> Tuple[str, ...]:
+    """Numbers and short codes (e.g. "1206", "cmi") that must match exactly for a hit."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    keys = {
+        t for t in tokens
+        if any(c.isdigit() for c in t) or (2 <= len(t) <= 4 and t not in _STOPWORDS)
+    }
+    return tuple(sorted(keys))
+
+
+class HashedNgramEmbedder:
+    """
+    Offline embedder: word unigrams plus character n-grams hashed into a fixed-size vector.
+    Lexical only, so at the default threshold it matches rewordings of case, punctuation and
+    filler words, not paraphrases that swap vocabulary ("weight" vs "how heavy").
+    """
+
+    def __init__(self, dim: int = 256, char_ngrams: Tuple[int, ...] = (3, 4)):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.name = f"hashed-ngram-{dim}-{'-'.join(map(str, char_ngrams))}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = [f"w:{t}" for t in tokens]
+        for token in tokens:
+            padded = f" {token} "
+            for n in self.char_ngrams:
+                features.extend(f"c:{padded[i:i + n]}" for i in range(max(len(padded) - n + 1, 1)))
+        return features
+
+    def __call__(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            # crc32 rather than hash(): vectors must stay stable across restarts
+            h = zlib.crc32(feature.encode("utf-8"))
+            vec[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+
+class OpenAIEmbedder:
+    """
+    Embeddings from POST /embeddings through the shared OpenAI client. Catches paraphrases the
+    hashed embedder misses, at one round trip per new prompt (a prompt looked up and then added
+    is embedded once).
+    """
+
+    def __init__(self, model: str = SEMANTIC_CACHE_EMBEDDING_MODEL, dim: int = SEMANTIC_CACHE_EMBEDDING_DIM):
+        self.model = model
+        self.dim = dim
+        self.name = f"openai-{model}-{dim}"
+        self._embed = lru_cache(maxsize=256)(self._request)
+
+    def _request(self, text: str) -> np.ndarray:
+        resp = openai_http.post("/embeddings", json={"model": self.model, "input": text, "dimensions": self.dim})
+        if resp.status_code != 200:
+            raise RuntimeError(f"Error embedding prompt: {resp.status_code} - {resp.text}")
+        vec = np.asarray(resp.json()["data"][0]["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def __call__(self, text: str) -> np.ndarray:
+        return self._embed(text)
+
+
+def make_embedder(kind: str = SEMANTIC_CACHE_EMBEDDER) -> Embedder:
+    """The embedder selected by SEMANTIC_CACHE_EMBEDDER: hashed (offline) or openai."""
+    if kind == "openai":
+        return OpenAIEmbedder()
+    if kind == "hashed":
+        return HashedNgramEmbedder()
+    raise ValueError(f"Unknown SEMANTIC_CACHE_EMBEDDER {kind!r} (expected hashed or openai)")
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        dim: Optional[int] = None,
+        capacity: int = SEMANTIC_CACHE_CAPACITY,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: Optional[float] = SEMANTIC_CACHE_TTL,
+    ):
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.dim = dim or getattr(self.embedder, "dim")
+        self.embedder_name = getattr(self.embedder, "name", type(self.embedder).__name__)
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._added_at = np.zeros(capacity, dtype=np.float64)  # wall clock, so the TTL survives restarts
+        self._prompts: List[str] = []
+        self._answers: List[str] = []
+        self._keys: List[Tuple[str, ...]] = []
+        self._clock = 0
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time, so the newest snapshot lands last
+        self._saving = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._prompts)
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        vec = np.asarray(self.embedder(prompt), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _expired(self, n: int) -> np.ndarray:
+        if self.ttl is None:
+            return np.zeros(n, dtype=bool)
+        return self._added_at[:n] < time.time() - self.ttl
+
+    def lookup(self, prompt: str) -> Optional[Tuple[str, float]]:
+        """Return (answer, similarity) of the closest live cached prompt, or None below the threshold."""
+        try:
+            vec = self._embed(prompt)
+        except Exception as e:
+            # The cache is only a shortcut: an embedding failure is a miss, not a failed turn
+            logger.warning("semantic cache: embedding failed, skipping lookup: %s", e)
+            with self._lock:
+                self.misses += 1
+            return None
+        keys = _key_tokens(prompt)
+        with self._lock:
+            n = len(self._prompts)
+            if n:
+                sims = np.where(self._expired(n), -np.inf, self._vectors[:n] @ vec)
+                idx = int(np.argmax(sims))
+                score = float(sims[idx])
+                if score >= self.threshold and self._keys[idx] == keys:
+                    self._clock += 1
+                    self._last_used[idx] = self._clock
+                    self.hits += 1
+                    return self._answers[idx], score
+            self.misses += 1
+            return None
+
+    def add(self, prompt: str, answer: str) -> None:
+        try:
+            vec = self._embed(prompt)
+        except Exception as e:
+            logger.warning("semantic cache: embedding failed, answer not cached: %s", e)
+            return
+        with self._lock:
+            self._clock += 1
+            if len(self._prompts) < self.capacity:
+                idx = len(self._prompts)
+                self._prompts.append(prompt)
+                self._answers.append(answer)
+                self._keys.append(_key_tokens(prompt))
+            else:
+                # Reuse an expired slot first, otherwise evict the least recently used entry
+                expired = self._expired(self.capacity)
+                idx = int(np.argmax(expired)) if expired.any() else int(np.argmin(self._last_used))
+                self._prompts[idx] = prompt
+                self._answers[idx] = answer
+                self._keys[idx] = _key_tokens(prompt)
+            self._vectors[idx] = vec
+            self._last_used[idx] = self._clock
+            self._added_at[idx] = time.time()
+            self._dirty += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._prompts), "hits": self.hits, "misses": self.misses}
+
+    # -------- persistence --------
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._save_lock:
+            with self._lock:
+                n = len(self._prompts)
+                meta = {
+                    "embedder": self.embedder_name,
+                    "dim": self.dim,
+                    "prompts": list(self._prompts),
+                    "answers": list(self._answers),
+                }
+                vectors = self._vectors[:n].copy()
+                last_used = self._last_used[:n].copy()
+                added_at = self._added_at[:n].copy()
+                self._dirty = 0
+            # Per-process temp name: app processes sharing SEMANTIC_CACHE_DIR never write the same file
+            tmp = path.with_suffix(f".{os.getpid()}.tmp.npz")
+            np.savez(tmp, vectors=vectors, last_used=last_used, added_at=added_at, meta=np.array(json.dumps(meta)))
+            os.replace(tmp, path)
+
+    def load(self, path: Path) -> bool:
+        """
+        Load a saved cache; ignored if missing or built with another embedder. Expired entries
+        are dropped (files saved before entries carried an add time count as expired).
+        """
+        if not path.exists():
+            return False
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["embedder"] != self.embedder_name or meta["dim"] != self.dim:
+                return False
+            total = len(meta["prompts"])
+            added_at = data["added_at"] if "added_at" in data.files else np.zeros(total)
+            live = np.ones(total, dtype=bool) if self.ttl is None else added_at >= time.time() - self.ttl
+            rows = np.flatnonzero(live)[: self.capacity]
+            n = len(rows)
+            with self._lock:
+                self._vectors[:n] = data["vectors"][rows]
+                self._last_used[:n] = data["last_used"][rows]
+                self._added_at[:n] = added_at[rows]
+                self._prompts = [meta["prompts"][i] for i in rows]
+                self._answers = [meta["answers"][i] for i in rows]
+                self._keys = [_key_tokens(p) for p in self._prompts]
+                self._clock = int(self._last_used[:n].max()) if n else 0
+        return True
+
+    def save_if_dirty(self, path: Path, every: int = 1) -> None:
+        if self._dirty >= every:
+            self.save(path)
+
+    def save_in_background(self, path: Path, every: int = 1) -> None:
+        """Start a save thread once every additions, unless one is already running."""
+        with self._lock:
+            if self._saving or self._dirty < every:
+                return
+            self._saving = True
+
+        def run() -> None:
+            try:
+                self.save(path)
+            finally:
+                self._saving = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+_caches: Dict[str, SemanticCache] = {}
+_caches_lock = threading.Lock()
+
+
+def cache_path(assistant_id: str) -> Path:
+    return SEMANTIC_CACHE_DIR / f"{assistant_id}.npz"
+
+
+def get_semantic_cache(assistant_id: str) -> SemanticCache:
+    """One cache per assistant id, loaded from disk on first use and saved again at exit."""
+    cache = _caches.get(assistant_id)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(assistant_id)
+            if cache is None:
+                cache = SemanticCache(make_embedder())
+                path = cache_path(assistant_id)
+                try:
+                    cache.load(path)
+                except Exception:
+                    pass
+                atexit.register(cache.save_if_dirty, path)
+                _caches[assistant_id] = cache
+    return cache
+
+
+def remember(assistant_id: str, prompt: str, answer: str) -> None:
+    """Add an answer and persist in the background every SEMANTIC_CACHE_SAVE_EVERY additions."""
+    cache = get_semantic_cache(assistant_id)
+    cache.add(prompt, answer)
+    cache.save_in_background(cache_path(assistant_id), SEMANTIC_CACHE_SAVE_EVERY)
@@ -0,0 +1,111 @@
+// Chat auto-scroll, installed once per page by the asset loader (assets.py).
+// Event-driven only: a MutationObserver notices newly appended chat messages and a
+// ResizeObserver follows the newest one while it streams. The view is moved to the
+// bottom only if the reader was already near it, so scrolling up to re-read is never
+// interrupted. No timers, and no style rewrites on mutation.
+(function () {
+    if (window.__bbrScrollManager) {
+        return;
+    }
+    window.__bbrScrollManager = true;
+
+    const MESSAGE = '[data-testid="stChatMessage"]';
+    const NEAR_BOTTOM_PX = 120;
+    let scroller = null;
+    let pinned = true;
+    let pending = false;
+    const grow = typeof ResizeObserver === "function" ? new ResizeObserver(onGrow) : null;
+
+    function scrollable(el) {
+        const style = window.getComputedStyle(el);
+        return /(auto|scroll)/.test(style.overflowY) && el.scrollHeight > el.clientHeight;
+    }
+
+    function findScroller(from) {
+        for (let el = from && from.parentElement; el && el !== document.body; el = el.parentElement) {
+            if (scrollable(el)) {
+                return el;
+            }
+        }
+        return document.scrollingElement || document.documentElement;
+    }
+
+    function distanceFromBottom(el) {
+        return el.scrollHeight - el.scrollTop - el.clientHeight;
+    }
+
+    function onScroll() {
+        pinned = distanceFromBottom(scroller) < NEAR_BOTTOM_PX;
+    }
+
+    function attach(message) {
+        const el = findScroller(message);
+        if (el !== scroller) {
+            if (scroller) {
+                (scroller === document.scrollingElement ? window : scroller).removeEventListener("scroll", onScroll);
+            }
+            scroller = el;
+            (scroller === document.scrollingElement ? window : scroller).addEventListener("scroll", onScroll, {passive: true});
+        }
+    }
+
+    function scrollToBottom() {
+        if (pending) {
+            return;
+        }
+        pending = true;
+        window.requestAnimationFrame(function () {
+            pending = false;
+            if (scroller && pinned) {
+                scroller.scrollTop = scroller.scrollHeight;
+            }
+        });
+    }
+
+    function onGrow() {
+        if (pinned) {
+            scrollToBottom();
+        }
+    }
+
+    function newestMessage(nodes) {
+        let found = null;
+        nodes.forEach(function (node) {
+            if (node.nodeType !== Node.ELEMENT_NODE) {
+                return;
+            }
+            const matches = node.matches(MESSAGE) ? [node] : node.querySelectorAll(MESSAGE);
+            if (matches.length) {
+                found = matches[matches.length - 1];
+            }
+        });
+        return found;
+    }
+
+    const observer = new MutationObserver(function (mutations) {
+        let message = null;
+        mutations.forEach(function (mutation) {
+            message = newestMessage(mutation.addedNodes) || message;
+        });
+        if (!message) {
+            return;
+        }
+        attach(message);
+        if (grow) {
+            grow.disconnect();
+            grow.observe(message);
+        }
+        if (pinned) {
+            scrollToBottom();
+        }
+    });
+
+    const root = document.querySelector('[data-testid="stAppViewContainer"]') || document.body;
+    observer.observe(root, {childList: true, subtree: true});
+
+    const existing = root.querySelectorAll(MESSAGE);
+    if (existing.length) {
+        attach(existing[existing.length - 1]);
+        scrollToBottom();
+    }
+})();
@@ -1,27 +1,145 @@
 """
 Supabase helpers for invite-only auth and chat persistence.
 Assumes tables exist (see docs/supabase_schema.sql).
+get_client() returns one process-wide client whose PostgREST connections are
+pooled and kept alive; it is health-checked after idle periods or reported
+connection failures and rebuilt if Supabase stops answering on it.
+Chat messages are written behind the request path: save_message() queues the
+row and a background thread sends batched multi-row upserts.
 """
 
+import atexit
+import logging
 import os
+import queue
 import secrets
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
-
-from supabase import Client, create_client
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from postgrest import SyncPostgrestClient
+from postgrest.types import ReturnMethod
+from postgrest.utils import SyncClient as PostgrestHTTPClient
+from supabase import Client, ClientOptions
+
+logger = logging.getLogger(__name__)
+
+# Connection pool size and timeouts (seconds) for PostgREST calls
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "10"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "20"))
+# Idle time (seconds) after which get_client() checks the connection before handing it out
+SUPABASE_HEALTH_INTERVAL = float(os.getenv("SUPABASE_HEALTH_INTERVAL", "60"))
+
+# Rows per multi-row insert, and how long the first queued row waits for company (seconds)
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "100"))
+PERSIST_BATCH_SECONDS = float(os.getenv("PERSIST_BATCH_SECONDS", "1.0"))
+# Queued rows before save_message() blocks, and for how long before it gives up (seconds)
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "10000"))
+PERSIST_ENQUEUE_TIMEOUT = float(os.getenv("PERSIST_ENQUEUE_TIMEOUT", "2"))
+PERSIST_RETRIES = int(os.getenv("PERSIST_RETRIES", "5"))
+# Time allowed at shutdown to write what is still queued (seconds)
+PERSIST_FLUSH_TIMEOUT = float(os.getenv("PERSIST_FLUSH_TIMEOUT", "10"))
 
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def get_client() -> Client:
+class _PooledPostgrest(SyncPostgrestClient):
+    def create_session(self, base_url, headers, timeout, verify=True) -> PostgrestHTTPClient:
+        return PostgrestHTTPClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(max_connections=SUPABASE_POOL_SIZE, max_keepalive_connections=SUPABASE_POOL_SIZE),
+        )
+
+
+class _PooledClient(Client):
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=SUPABASE_TIMEOUT, verify=True) -> SyncPostgrestClient:
+        return _PooledPostgrest(rest_url, headers=headers, schema=schema, timeout=timeout, verify=verify)
+
+
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
+_last_used = 0.0
+_suspect = False
+
+
+def _create_client() -> Client:
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
     if not url or not key:
         raise RuntimeError("Supabase config missing. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY/ANON_KEY.")
-    return create_client(url, key)
+    options = ClientOptions(
+        postgrest_client_timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+        # Server-side key: no user session to persist or refresh
+        auto_refresh_token=False,
+        persist_session=False,
+    )
+    return _PooledClient.create(url, key, options)
+
+
+def get_client() -> Client:
+    """
+    The shared client, created on first use. After SUPABASE_HEALTH_INTERVAL idle seconds,
+    or once report_failure() has seen a connection error, it is checked first and rebuilt
+    if the check fails.
+    """
+    global _client, _last_used, _suspect
+    with _client_lock:
+        now = time.monotonic()
+        if _client is not None and (_suspect or now - _last_used > SUPABASE_HEALTH_INTERVAL):
+            if not check_health(_client):
+                logger.warning("Supabase connection unhealthy, reconnecting")
+                _close_quietly(_client)
+                _client = None
+            _suspect = False
+        if _client is None:
+            _client = _create_client()
+        _last_used = now
+        return _client
+
+
+def check_health(client: Optional[Client] = None) -> bool:
+    """True if PostgREST answers a HEAD request (any status below 500) on the client's pool."""
+    client = client or get_client()
+    try:
+        resp = client.postgrest.session.head("/", timeout=SUPABASE_CONNECT_TIMEOUT)
+    except httpx.HTTPError:
+        return False
+    return resp.status_code < 500
+
+
+def report_failure(error: BaseException) -> None:
+    """Have the next get_client() check the connection if `error` was a transport failure."""
+    global _suspect
+    if isinstance(error, httpx.TransportError):
+        _suspect = True
+
+
+def reset_client() -> None:
+    """Close the shared client's connections; the next get_client() builds a new one."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _close_quietly(_client)
+            _client = None
+
+
+def _close_quietly(client: Client) -> None:
+    try:
+        client.postgrest.session.close()
+    except Exception:
+        pass
 
 
 def get_user_by_email(client: Client, email: str) -> Optional[Dict[str, Any]]:
@@ -111,7 +229,7 @@ def list_invites(client: Client, limit: int = 20) -> List[Dict[str, Any]]:
     return res.data or []
 
 
-def create_session(client: Client, user_id: str, client_info: Optional[str] = None) -> Dict[str, Any]:
+def create_session(client: Client, user_id: Optional[str], client_info: Optional[str] = None) -> Dict[str, Any]:
     payload = {
         "id": str(uuid.uuid4()),
         "user_id": user_id,
@@ -127,13 +245,22 @@ def touch_session(client: Client, session_id: str) -> None:
     client.table("sessions").update({"last_active_at": _now().isoformat()}).eq("id", session_id).execute()
 
 
+def set_session_thread(client: Client, session_id: str, thread_id: str) -> None:
+    client.table("sessions").update({"thread_id": thread_id}).eq("id", session_id).execute()
+
+
 def get_session(client: Client, session_id: str) -> Optional[Dict[str, Any]]:
     res = client.table("sessions").select("*").eq("id", session_id).limit(1).execute()
     data = res.data or []
     return data[0] if data else None
 
 
-def save_message(client: Client, session_id: str, user_id: Optional[str], role: str, content: str) -> None:
+def save_message(session_id: str, user_id: Optional[str], role: str, content: str) -> None:
+    """
+    Queue a message for the background writer and return immediately; batches are sent on
+    the shared get_client() connection, so no client (or health check) is needed here.
+    Raises RuntimeError if the queue stays full for PERSIST_ENQUEUE_TIMEOUT seconds.
+    """
     payload = {
         "id": str(uuid.uuid4()),
         "session_id": session_id,
@@ -142,7 +269,125 @@ def save_message(client: Client, session_id: str, user_id: Optional[str], role:
         "content": content,
         "created_at": _now().isoformat(),
     }
-    client.table("messages").insert(payload).execute()
+    get_message_writer().submit(payload)
+
+
+def insert_messages(client: Client, rows: List[Dict[str, Any]]) -> None:
+    """
+    One multi-row insert. Rows carry their own UUIDs and conflicts on id are ignored,
+    so a retried batch never duplicates rows that already landed.
+    """
+    client.table("messages").upsert(
+        rows, on_conflict="id", ignore_duplicates=True, returning=ReturnMethod.minimal
+    ).execute()
+
+
+class MessageWriter:
+    """
+    Write-behind queue for message rows. A daemon thread drains it into batches of up to
+    batch_size rows (or whatever arrived within batch_seconds of the first) and retries
+    failed batches with exponential backoff; rows are dropped, and logged, only after
+    `retries` failed attempts.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Client] = get_client,
+        batch_size: int = PERSIST_BATCH_SIZE,
+        batch_seconds: float = PERSIST_BATCH_SECONDS,
+        max_queue: int = PERSIST_QUEUE_SIZE,
+        retries: int = PERSIST_RETRIES,
+    ):
+        self._client_factory = client_factory
+        self.batch_size = max(batch_size, 1)
+        self.batch_seconds = batch_seconds
+        self.retries = retries
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._run, name="supabase-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: Dict[str, Any], timeout: float = PERSIST_ENQUEUE_TIMEOUT) -> None:
+        try:
+            self._queue.put(row, timeout=timeout)
+        except queue.Full:
+            raise RuntimeError(f"Message queue full ({self._queue.maxsize} rows waiting for Supabase)") from None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued row has been written (or dropped); False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                insert_messages(self._client_factory(), batch)
+            except Exception as e:
+                report_failure(e)
+                if attempt == self.retries:
+                    self.dropped += len(batch)
+                    logger.error("dropping %d messages after %d attempts: %s", len(batch), attempt + 1, e)
+                    return
+                delay = min(0.5 * 2 ** attempt, 30.0)
+                logger.warning("message batch of %d failed (%s), retrying in %.1fs", len(batch), e, delay)
+                time.sleep(delay)
+            else:
+                self.written += len(batch)
+                self.batches += 1
+                return
+
+
+_writer: Optional[MessageWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_message_writer() -> MessageWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = MessageWriter()
+                atexit.register(flush_messages)
+    return _writer
+
+
+def flush_messages(timeout: float = PERSIST_FLUSH_TIMEOUT) -> bool:
+    """Write out queued messages (called at exit); False if some were still pending at the timeout."""
+    if _writer is None:
+        return True
+    done = _writer.flush(timeout)
+    if not done:
+        logger.error("exiting with %d messages not yet written to Supabase", _writer.pending())
+    return done
 
 
 def fetch_messages(client: Client, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
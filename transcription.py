@@ -0,0 +1,73 @@
+"""
+Speech-to-text for voice input, keyed by a hash of the audio bytes.
+audio_recorder returns the same clip on every rerun until a new one is recorded;
+callers track the hashes they have already submitted, and a small shared LRU of
+recent transcripts means a clip is never sent to the transcription API twice.
+Clips are trimmed and re-encoded by audio_preprocess before upload.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+import audio_preprocess
+import openai_http
+from caching import ByteLRUCache
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBE_MODEL = os.getenv("TRANSCRIBE_MODEL", "whisper-1")
+TRANSCRIPT_CACHE_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_ENTRIES", "256"))
+TRANSCRIPT_CACHE_TTL = float(os.getenv("TRANSCRIPT_CACHE_TTL", "3600"))
+
+_transcript_cache: Optional[ByteLRUCache[str]] = None
+_transcript_lock = threading.Lock()
+
+
+def audio_hash(audio_bytes: bytes) -> str:
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+def get_transcript_cache() -> ByteLRUCache[str]:
+    global _transcript_cache
+    if _transcript_cache is None:
+        with _transcript_lock:
+            if _transcript_cache is None:
+                _transcript_cache = ByteLRUCache(
+                    max_bytes=1024 * 1024,
+                    max_entries=TRANSCRIPT_CACHE_ENTRIES,
+                    ttl=TRANSCRIPT_CACHE_TTL,
+                )
+    return _transcript_cache
+
+
+def transcribe(audio_bytes: bytes, digest: Optional[str] = None) -> str:
+    """
+    Transcribe a WAV clip, reusing a cached transcript; "" when the clip holds no speech.
+    Raises RuntimeError on API errors.
+    """
+    digest = digest or audio_hash(audio_bytes)
+    cache = get_transcript_cache()
+    text = cache.get(digest)
+    if text is not None:
+        return text
+
+    try:
+        prepared = audio_preprocess.prepare(audio_bytes)
+    except Exception as e:
+        logger.warning("audio preprocessing failed, uploading the raw clip: %s", e)
+        files = {"file": ("audio.wav", audio_bytes, "audio/wav")}
+    else:
+        if prepared is None:
+            return ""
+        files = {"file": (prepared.filename, prepared.data, prepared.mime)}
+
+    resp = openai_http.post("/audio/transcriptions", data={"model": TRANSCRIBE_MODEL}, files=files)
+    if resp.status_code != 200:
+        raise RuntimeError(f"Transcription failed: {resp.text}")
+    text = resp.json().get("text", "").strip()
+    if text:
+        cache.put(digest, text)
+    return text
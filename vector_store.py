@@ -0,0 +1,173 @@
+"""
+Vector-store upload path for large documents.
+Files are pushed to the OpenAI Files API and indexed into a vector store in a
+background thread, then attached to a session's thread for the assistant's
+file_search tool, so a manual is never pasted into prompts. Uploads are deduped
+by content hash: a datasheet already indexed (by this or another session, or
+before a restart, via a small JSON index on disk) is reused without re-uploading.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+import openai_http
+from run_waiter import BackoffPolicy, wait_for_run
+
+VECTOR_STORE_UPLOAD_MB = float(os.getenv("VECTOR_STORE_UPLOAD_MB", "100"))
+VECTOR_STORE_WORKERS = int(os.getenv("VECTOR_STORE_WORKERS", "2"))
+VECTOR_STORE_INDEX_TIMEOUT = float(os.getenv("VECTOR_STORE_INDEX_TIMEOUT", "600"))
+# Stores unused for this many days are deleted by OpenAI; re-uploaded on next use
+VECTOR_STORE_EXPIRY_DAYS = int(os.getenv("VECTOR_STORE_EXPIRY_DAYS", "30"))
+VECTOR_STORE_INDEX = Path(os.getenv("VECTOR_STORE_INDEX", ".cache/vector_stores.json"))
+
+
+@dataclass
+class IndexedFile:
+    name: str
+    sha256: str
+    file_id: str
+    vector_store_id: str
+
+
+def _json_or_raise(resp, action: str) -> Dict:
+    if resp.status_code != 200:
+        raise RuntimeError(f"Error {action}: {resp.status_code} - {resp.text}")
+    return resp.json()
+
+
+def upload_file(name: str, fileobj: BinaryIO) -> str:
+    resp = openai_http.post(
+        "/files",
+        data={"purpose": "assistants"},
+        files={"file": (name, fileobj)},
+        timeout=(openai_http.CONNECT_TIMEOUT, VECTOR_STORE_INDEX_TIMEOUT),
+    )
+    return _json_or_raise(resp, "uploading file")["id"]
+
+
+def create_vector_store(name: str, file_id: str) -> str:
+    payload = {
+        "name": name,
+        "file_ids": [file_id],
+        "expires_after": {"anchor": "last_active_at", "days": VECTOR_STORE_EXPIRY_DAYS},
+    }
+    resp = openai_http.post("/vector_stores", json=payload)
+    return _json_or_raise(resp, "creating vector store")["id"]
+
+
+def get_vector_store(vector_store_id: str) -> Optional[Dict]:
+    """The store, or None if it no longer exists."""
+    resp = openai_http.get(f"/vector_stores/{vector_store_id}")
+    if resp.status_code == 404:
+        return None
+    return _json_or_raise(resp, "checking vector store")
+
+
+def wait_until_indexed(vector_store_id: str) -> None:
+    policy = BackoffPolicy(initial=0.5, cap=5.0, deadline=VECTOR_STORE_INDEX_TIMEOUT)
+    result = wait_for_run(lambda: get_vector_store(vector_store_id) or {"status": "expired"}, policy)
+    if result.status != "completed":
+        raise RuntimeError(f"Indexing did not finish: {result.status}")
+    if (result.run.get("file_counts") or {}).get("failed"):
+        raise RuntimeError("The file could not be indexed")
+
+
+def attach_to_thread(thread_id: str, vector_store_id: str) -> None:
+    """Make the store searchable by file_search on this thread (replaces any previous one)."""
+    payload = {"tool_resources": {"file_search": {"vector_store_ids": [vector_store_id]}}}
+    resp = openai_http.post(f"/threads/{thread_id}", json=payload)
+    _json_or_raise(resp, "attaching vector store")
+
+
+class VectorStoreIndex:
+    """sha256 -> IndexedFile, persisted as JSON so restarts keep their uploads."""
+
+    def __init__(self, path: Path = VECTOR_STORE_INDEX):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, IndexedFile] = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._entries = {k: IndexedFile(**v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def get(self, digest: str) -> Optional[IndexedFile]:
+        with self._lock:
+            return self._entries.get(digest)
+
+    def put(self, entry: IndexedFile) -> None:
+        with self._lock:
+            self._entries[entry.sha256] = entry
+            self._save()
+
+    def pop(self, digest: str) -> None:
+        with self._lock:
+            if self._entries.pop(digest, None) is not None:
+                self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k: asdict(v) for k, v in self._entries.items()}, f)
+        os.replace(tmp, self.path)
+
+
+class VectorStoreUploader:
+    def __init__(self, index: Optional[VectorStoreIndex] = None, workers: int = VECTOR_STORE_WORKERS):
+        self.index = index or VectorStoreIndex()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vector-store")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, fileobj: BinaryIO, digest: str) -> "Future[IndexedFile]":
+        """
+        Index a file in the background. Concurrent submissions of the same content share
+        one upload, and content indexed earlier is reused once its store is confirmed alive.
+        """
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is None:
+                future = self._executor.submit(self._index, name, fileobj, digest)
+                self._pending[digest] = future
+                future.add_done_callback(lambda _: self._forget(digest))
+            return future
+
+    def _forget(self, digest: str) -> None:
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def _index(self, name: str, fileobj: BinaryIO, digest: str) -> IndexedFile:
+        known = self.index.get(digest)
+        if known is not None:
+            store = get_vector_store(known.vector_store_id)
+            if store is not None and store.get("status") != "expired":
+                return known
+            self.index.pop(digest)
+
+        fileobj.seek(0)
+        file_id = upload_file(name, fileobj)
+        vector_store_id = create_vector_store(name, file_id)
+        wait_until_indexed(vector_store_id)
+        entry = IndexedFile(name=name, sha256=digest, file_id=file_id, vector_store_id=vector_store_id)
+        self.index.put(entry)
+        return entry
+
+
+_uploader: Optional[VectorStoreUploader] = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader() -> VectorStoreUploader:
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                _uploader = VectorStoreUploader()
+    return _uploader
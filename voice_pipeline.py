@@ -0,0 +1,122 @@
+"""
+Pipelined voice turns.
+A recorded clip is transcribed on a worker thread, and as soon as the transcript
+is ready the same worker prepares the prompt, creates the conversation thread
+(if the session has none yet; never for an empty or failed transcript) and
+starts the assistant run itself. The script thread only waits for the transcript
+to show it, then reads answer chunks from a queue as the worker produces them.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+import transcription
+
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "8"))
+VOICE_TRANSCRIPT_TIMEOUT = float(os.getenv("VOICE_TRANSCRIPT_TIMEOUT", "60"))
+
+_DONE = object()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=VOICE_WORKERS, thread_name_prefix="voice")
+    return _executor
+
+
+class VoiceTurn:
+    """
+    One voice message in flight. prepare(transcript) runs on the worker and its result is
+    kept as .plan (None if it raised); respond(thread_id, plan) yields the answer text.
+    A cancelled turn never starts its assistant run, and stops one it is streaming.
+    """
+
+    def __init__(
+        self,
+        audio_bytes: bytes,
+        digest: str,
+        thread_id: Optional[str],
+        create_thread: Callable[[], str],
+        prepare: Callable[[str], Any],
+        respond: Callable[[str, Any], Iterator[str]],
+    ):
+        self.thread_id = thread_id
+        self.plan: Any = None
+        self._chunks: "queue.Queue[Any]" = queue.Queue()
+        self._cancelled = threading.Event()
+        self._transcript: "Future[str]" = Future()
+        self._transcript.set_running_or_notify_cancel()
+        self._job = _get_executor().submit(self._run, audio_bytes, digest, create_thread, prepare, respond)
+
+    def _run(self, audio_bytes: bytes, digest: str, create_thread, prepare, respond) -> None:
+        try:
+            text = transcription.transcribe(audio_bytes, digest)
+        except BaseException as e:
+            self._transcript.set_exception(e)
+            self._chunks.put(_DONE)
+            return
+        self._transcript.set_result(text)
+        if not text or self._cancelled.is_set():
+            self._chunks.put(_DONE)
+            return
+        try:
+            self.plan = prepare(text)
+            if self.thread_id is None and not self._cancelled.is_set():
+                self.thread_id = create_thread()
+            if not self._cancelled.is_set():
+                self._stream(respond(self.thread_id, self.plan))
+        except BaseException as e:
+            self._chunks.put(e)
+        self._chunks.put(_DONE)
+
+    def _stream(self, chunks: Iterator[str]) -> None:
+        try:
+            for chunk in chunks:
+                if self._cancelled.is_set():
+                    break
+                self._chunks.put(chunk)
+        finally:
+            # Closing the respond generator runs its cleanup, which cancels an unfinished run
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def cancel(self) -> None:
+        """Drop the turn: no assistant run is started, and a streaming one is stopped."""
+        self._cancelled.set()
+
+    def transcript(self, timeout: float = VOICE_TRANSCRIPT_TIMEOUT) -> str:
+        """
+        Block until the transcript is ready; raises the transcription error, if any. A turn
+        whose transcript times out or fails is cancelled, since nobody will read its answer.
+        """
+        try:
+            return self._transcript.result(timeout)
+        except BaseException:
+            self.cancel()
+            raise
+
+    def answer(self) -> Iterator[str]:
+        """
+        Answer chunks as the worker produces them; re-raises the worker's error. A reader
+        that stops early (e.g. the script reran mid-stream) cancels the turn.
+        """
+        try:
+            while True:
+                item = self._chunks.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self.cancel()